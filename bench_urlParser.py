@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    UrlDeconstruction Benchmark
+    ---------------------------
+    Measures stage and end to end throughput, latency and memory of UrlDeconstruction
+    :copyright: (c) 2015 by Calvin Schultz.
+    :license: BSD, see LICENSE for more details.
+
+    Usage:
+    	python3 bench_urlParser.py [--count N] [--seed S] [--save FILE] [--compare FILE]
+    	python3 bench_urlParser.py --readme [rounds]
+
+    Notes:
+    	The corpus is generated from a seed, the same seed gives the same urls on every run
+    	--readme times the example URLs listed in README.txt, one at a time
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import platform
+import tracemalloc
+import urllib.parse
+from urlParser import UrlDeconstruction, Serializer, SERIALIZERS
+
+#README.txt next to this script, --readme times the urls in its "Some URL Examples" section
+README_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'README.txt')
+
+#Host forms of the generated corpus and their share of it, every form README.txt lists
+HOST_FORMS = (
+	('domain', 		30),
+	('subdomain', 	25),
+	('localhost', 	3),
+	('dotnot', 		15),
+	('dothex', 		3),
+	('dotoct', 		3),
+	('hexdec', 		3),
+	('dec', 		3),
+	('ipv6std', 	10),
+	('ipv6oct', 	5),
+)
+
+SCHEMES 	= ('http://', 'https://', 'https://', 'ftp://', '')
+TLDS 		= ('com', 'net', 'org', 'io', 'co.uk', 'de')
+WORDS 		= ('www', 'api', 'cdn', 'static', 'mail', 'shop', 'news', 'login', 'img', 'docs', 'blog', 'app')
+PAGES 		= ('index.html', 'page.do', 'search', 'view.php', 'item', 'download.zip', '')
+KEYS 		= ('id', 'q', 'page', 'lang', 'ref', 'session', 'sort', 'utm_source', 'utm_medium', 'token')
+
+#Stages timed on their own, in the order urlParseEngine runs them
+STAGES = ('unquote', 'scheme', 'credential', 'host', 'anchor', 'path', 'cgi')
+
+#Parameter counts of the long query strings the two query engines are timed on
+QUERY_PARAMS = (5, 50, 200, 500)
+
+
+def hostName(rnd, form):
+	"""
+		Returns a host of the given HOST_FORMS form
+	"""
+	address = rnd.getrandbits(32)
+	octets 	= [(address >> shift) & 0xff for shift in (24, 16, 8, 0)]
+	if form == 'domain': 		return '%s%d.%s' % (rnd.choice(WORDS), rnd.randrange(100), rnd.choice(TLDS))
+	if form == 'subdomain': 	return '%s.%s.%s' % ('.'.join(rnd.sample(WORDS, rnd.randint(1, 3))), rnd.choice(WORDS), rnd.choice(TLDS))
+	if form == 'localhost': 	return 'localhost'
+	if form == 'dotnot': 		return '.'.join(str(octet) for octet in octets)
+	if form == 'dothex': 		return '.'.join('0x%02X' % octet for octet in octets)
+	if form == 'dotoct': 		return '.'.join('%04o' % octet for octet in octets)
+	if form == 'hexdec': 		return '0x%08X' % address
+	if form == 'dec': 			return '%010d' % max(address, 1000000000)
+	if form == 'ipv6oct': 		return '%039d' % rnd.getrandbits(127)
+	words = ['%x' % rnd.getrandbits(16) for n in range(8)]
+	if rnd.random() < 0.5:
+		start 	= rnd.randrange(7)
+		words[start:start + rnd.randint(2, 8 - start)] = ['']
+		if words[0] == '': 	words.insert(0, '')
+		if words[-1] == '': words.append('')
+	return '[%s]' % ':'.join(words)
+
+
+def generateCorpus(count=20000, seed=1):
+	"""
+		Returns a list of count synthetic urls, the same for the same seed
+		Host forms follow HOST_FORMS, with a realistic mix of ports, credentials, paths, CGI and anchors
+	"""
+	rnd 	= random.Random(seed)
+	forms 	= [form for form, weight in HOST_FORMS for n in range(weight)]
+	urls 	= []
+	for n in range(count):
+		form 	= rnd.choice(forms)
+		url 	= rnd.choice(SCHEMES)
+		if rnd.random() < 0.1:
+			url += 'user%d:pass%d@' % (n % 7, n % 5) if rnd.random() < 0.7 else 'user%d@' % (n % 7)
+		url += hostName(rnd, form)
+		if rnd.random() < 0.2:
+			url += ':%d' % rnd.choice((80, 443, 8080, 8443, rnd.randrange(1024, 65536)))
+		#Host patterns need a '/' (or the end) after the host, so query and anchor only follow a path
+		hasQuery 	= rnd.random() < 0.5
+		hasAnchor 	= rnd.random() < 0.1
+		if hasQuery or hasAnchor or rnd.random() < 0.8:
+			url += '/' + '/'.join(rnd.choice(WORDS) for depth in range(rnd.randint(0, 5)))
+			url += ('/' + rnd.choice(PAGES)) if rnd.random() < 0.6 else '/'
+		if hasQuery:
+			args = ['%s=%s' % (rnd.choice(KEYS), rnd.choice(('one+two', str(rnd.randrange(10 ** 6)), rnd.choice(WORDS), 'a%20b')))
+					for arg in range(rnd.randint(1, 6))]
+			url += '?' + ''.join(arg + rnd.choice(('&', '&', ';')) for arg in args[:-1]) + args[-1]
+		if hasAnchor:
+			url += '#' + rnd.choice(('top', 'section-2', 'AnchorOnPage', 'comments'))
+		if rnd.random() < 0.03:
+			url = urllib.parse.quote(url, safe='')
+		urls.append(url)
+	return urls
+
+
+def generateQueries(count=200, params=50, seed=1):
+	"""
+		Returns a list of count query strings of params parameters each, ad-tech style,
+		keys repeat and some values are percent encoded
+	"""
+	rnd 	= random.Random(seed)
+	keys 	= KEYS + tuple('p%d' % n for n in range(params))
+	queries = []
+	for n in range(count):
+		args = ['%s=%s' % (rnd.choice(keys), rnd.choice((str(rnd.randrange(10 ** 9)), rnd.choice(WORDS), 'one+two', 'a%2Cb', '')))
+				for arg in range(params)]
+		queries.append(''.join(arg + rnd.choice(('&', '&', '&', ';')) for arg in args[:-1]) + args[-1])
+	return queries
+
+
+def stageInputs(urld, urls):
+	"""
+		Returns dict of stage name -> list of the strings urlParseEngine hands that stage
+	"""
+	inputs 	= {stage: [] for stage in STAGES}
+	stages 	= (('scheme', urld.parseScheme), ('credential', urld.parseCredentials), ('host', urld.parseHost),
+			   ('anchor', urld.parseAnchor), ('path', urld.parsePath), ('cgi', urld.parseCGI))
+	for url in urls:
+		inputs['unquote'].append(url)
+		urlString = urllib.parse.unquote(url)
+		for (stage, parser) in stages:
+			inputs[stage].append(urlString)
+			(results, newUrlString) = parser(urlString)
+			if results is not None:
+				urlString = newUrlString
+			elif stage == 'host':
+				break
+	return inputs
+
+
+def bestOf(function, repeat):
+	"""
+		Returns the fastest of repeat runs of function, in seconds
+	"""
+	return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def latencies(function, urls):
+	"""
+		Returns sorted per url times in seconds of function(url)
+	"""
+	counter = time.perf_counter
+	times 	= []
+	for url in urls:
+		started = counter()
+		function(url)
+		times.append(counter() - started)
+	times.sort()
+	return times
+
+
+def percentile(times, q):
+	return times[min(int(q * len(times)), len(times) - 1)]
+
+
+def peakMemory(function):
+	"""
+		Returns the peak bytes traced while function runs, and what it returned
+	"""
+	tracemalloc.start()
+	try:
+		result 	= function()
+		peak 	= tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+	return (peak, result)
+
+
+def runBenchmark(count=20000, seed=1, repeat=5):
+	"""
+		Run every benchmark over a generated corpus
+
+		Returns JSON friendly dict of the settings and results
+	"""
+	urls 	= generateCorpus(count, seed)
+	data 	= [url.encode() for url in urls]
+	urld 	= UrlDeconstruction()
+	results = {'corpus': {'count': count, 'seed': seed}, 'python': platform.python_version(), 'stages': {}, 'endToEnd': {}}
+
+	#Per stage, each parser on the inputs urlParseEngine gives it
+	parsers = {'unquote': urllib.parse.unquote, 'scheme': urld.parseScheme, 'credential': urld.parseCredentials,
+			   'host': urld.parseHost, 'anchor': urld.parseAnchor, 'path': urld.parsePath, 'cgi': urld.parseCGI}
+	for stage, inputs in stageInputs(urld, urls).items():
+		parser 	= parsers[stage]
+		seconds = bestOf(lambda: [parser(urlString) for urlString in inputs], repeat)
+		results['stages'][stage] = {'calls': len(inputs), 'usPerCall': seconds / max(len(inputs), 1) * 1e6}
+
+	#End to end, throughput over the corpus and per url latency
+	engines = {	'urlParseEngine': 	(urls, lambda: [urld.urlParseEngine(url) for url in urls], urld.urlParseEngine),
+				'parse_many': 		(urls, lambda: list(urld.parse_many(urls)), None),
+				'parseUrl': 		(urls, lambda: [urld.parseUrl(url).to_dict() for url in urls], lambda url: urld.parseUrl(url).to_dict()),
+				'parseUrlLazyHost': (urls, lambda: [urld.parseUrl(url, lazy=True).host for url in urls], lambda url: urld.parseUrl(url, lazy=True).host),
+				'parseBytes': 		(data, lambda: [urld.parseUrl(url).to_dict() for url in data], lambda url: urld.parseUrl(url).to_dict())}
+	for name, (inputs, batch, single) in engines.items():
+		seconds = bestOf(batch, repeat)
+		result 	= {'urlsPerSecond': len(inputs) / seconds, 'usPerUrl': seconds / len(inputs) * 1e6}
+		if single is not None:
+			times 			= latencies(single, inputs)
+			result['p50Us'] = percentile(times, 0.50) * 1e6
+			result['p99Us'] = percentile(times, 0.99) * 1e6
+		results['endToEnd'][name] = result
+
+	#Peak memory of holding every result
+	(peak, kept) = peakMemory(lambda: list(urld.parse_many(urls)))
+	results['memory'] = {'dictsPeakBytes': peak, 'dictsBytesPerUrl': peak / count}
+	del kept
+	(peak, kept) = peakMemory(lambda: list(urld.parse_many(urls, compact=True)))
+	results['memory'].update({'compactPeakBytes': peak, 'compactBytesPerUrl': peak / count})
+
+	#Query engines on long query strings, the cgi regex against the split engine
+	results['queries'] = {}
+	for params in QUERY_PARAMS:
+		queries = generateQueries(200, params, seed)
+		timings = {	'regex': 		lambda: [urld.parseCGI(query) for query in queries],
+					'split': 		lambda: [urld.parseQuery(query).to_dict() for query in queries],
+					'splitMulti': 	lambda: [urld.parseQuery(query).to_dict(multiValue=True) for query in queries]}
+		results['queries'][str(params)] = {name: bestOf(batch, repeat) / len(queries) * 1e6 for name, batch in timings.items()}
+
+	#Output, returnJson as the CLI writes single urls against every serializer that can be loaded
+	dicts 					= list(urld.parse_many(urls))
+	returnJson 				= lambda components: json.dumps(components, sort_keys=True, indent=4, separators=(',', ': '))
+	results['serializers'] 	= {'returnJson': bestOf(lambda: [returnJson(components) for components in dicts], repeat) / count * 1e6}
+	for name in SERIALIZERS:
+		try:
+			record = Serializer(name).record
+		except ImportError:
+			continue
+		results['serializers'][name] = bestOf(lambda: [record(components) for components in dicts], repeat) / count * 1e6
+	return results
+
+
+def flatten(results, prefix=''):
+	"""
+		Returns dict of 'section.name.metric' -> number for the numeric results
+	"""
+	flat = {}
+	for key, value in results.items():
+		if type(value) is dict:
+			flat.update(flatten(value, prefix + key + '.'))
+		elif type(value) in (int, float) and not prefix.startswith('corpus.'):
+			flat[prefix + key] = value
+	return flat
+
+
+def compareResults(baseline, current):
+	"""
+		Returns list of (metric, baseline, current, percent change) for the metrics both runs have
+	"""
+	(old, new) = (flatten(baseline), flatten(current))
+	return [(metric, old[metric], new[metric], (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0)
+			for metric in old if metric in new]
+
+
+def printResults(results):
+	print('corpus: %(count)d urls, seed %(seed)d' % results['corpus'])
+	print('\nstage 		us/call 	calls')
+	for stage, result in results['stages'].items():
+		print('%-12s 	%7.2f 	%d' % (stage, result['usPerCall'], result['calls']))
+	print('\nend to end 		urls/s 		us/url 	p50 us 	p99 us')
+	for name, result in results['endToEnd'].items():
+		print('%-16s 	%9.0f 	%6.2f 	%6s 	%6s' % (name, result['urlsPerSecond'], result['usPerUrl'],
+				'%.2f' % result['p50Us'] if 'p50Us' in result else '-', '%.2f' % result['p99Us'] if 'p99Us' in result else '-'))
+	print('\nmemory 	%(dictsBytesPerUrl).0f bytes/url as dicts, %(compactBytesPerUrl).0f bytes/url compact' % results['memory'])
+	print('\nquery params 	regex us 	split us 	multi us')
+	for params, result in results['queries'].items():
+		print('%12s 	%8.2f 	%8.2f 	%8.2f' % (params, result['regex'], result['split'], result['splitMulti']))
+	print('\nserializer 	us/url')
+	for name, usPerUrl in results['serializers'].items():
+		print('%-12s 	%6.2f' % (name, usPerUrl))
+
+
+def benchUrl(urld, url, rounds):
+	"""
+		Returns best-of-five per-URL latency in microseconds
+	"""
+	timer = timeit.Timer(lambda: urld.urlParseEngine(url))
+	return min(timer.repeat(repeat=5, number=rounds)) / rounds * 1e6
+
+
+def readmeUrls(path=README_PATH):
+	"""
+		Returns the example urls of README.txt, the lines of its "Some URL Examples" section holding a '://'
+	"""
+	(urls, inSection) = ([], False)
+	with open(path, encoding='utf-8') as readme:
+		for line in readme:
+			line = line.strip()
+			if line == 'Some URL Examples':
+				inSection = True
+			elif line == 'Output Examples':
+				break
+			elif inSection and '://' in line:
+				urls.append(line)
+	return urls
+
+
+def benchReadme(rounds=2000):
+	urld 	= UrlDeconstruction()
+	urls 	= readmeUrls()
+	total 	= 0.0
+	for url in urls:
+		usec 	= benchUrl(urld, url, rounds)
+		total 	+= usec
+		print('%8.2f us  %s' % (usec, url))
+	print('%8.2f us  mean per URL' % (total / len(urls)))
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark UrlDeconstruction on a generated url corpus')
+	parser.add_argument('--count', type=int, default=20000, help='urls in the corpus (default: %(default)s)')
+	parser.add_argument('--seed', type=int, default=1, help='corpus seed (default: %(default)s)')
+	parser.add_argument('--repeat', type=int, default=5, help='runs per throughput figure, the best is kept (default: %(default)s)')
+	parser.add_argument('--save', metavar='FILE', help='write the results as JSON to FILE')
+	parser.add_argument('--compare', metavar='FILE', help='compare against the JSON results saved in FILE')
+	parser.add_argument('--readme', nargs='?', type=int, const=2000, metavar='ROUNDS', help='time the README.txt urls instead')
+	args = parser.parse_args(argv)
+
+	if args.readme is not None:
+		benchReadme(args.readme)
+		return 0
+
+	results = runBenchmark(args.count, args.seed, args.repeat)
+	printResults(results)
+	if args.save:
+		with open(args.save, 'w') as outFile:
+			json.dump(results, outFile, indent=4)
+	if args.compare:
+		with open(args.compare) as inFile:
+			baseline = json.load(inFile)
+		if baseline.get('corpus') != results['corpus']:
+			print('\nwarning: baseline corpus %r differs from this run' % (baseline.get('corpus'),))
+		print('\nmetric 								baseline 	current 	change')
+		for (metric, old, new, change) in compareResults(baseline, results):
+			print('%-40s 	%10.2f 	%10.2f 	%+6.1f%%' % (metric, old, new, change))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
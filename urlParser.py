@@ -1,490 +1,4188 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
+import os
 import sys
+import time
+import bisect
+import socket
+import gzip
+import asyncio
+import argparse
+import threading
+import itertools
+import collections
+import array
+import csv
+import concurrent.futures
+import http.server
 import urllib.parse
-import netaddr
 import re
 import json
+import math
+import struct
+import hashlib
 import traceback
 
 
+class UrlParseError(ValueError):
+	"""
+		Raised when a url can't be deconstructed
+		components holds what was parsed before the error
+	"""
+
+	def __init__(self, message, components=None, stage=None, offset=None):
+		ValueError.__init__(self, message)
+		self.components = components if components is not None else {}
+		self.stage 		= stage
+		self.offset 	= offset
+
+	def __reduce__(self):
+		#Keep the components when sent back from a worker process
+		return (self.__class__, (str(self), self.components, self.stage, self.offset))
+
+
+class NoHostError(UrlParseError):
+	"""
+		No ipv6, ipv4 or domain host where one was expected
+	"""
+
+
+class CredentialError(UrlParseError):
+	"""
+		Credentials with more than one ':', they can't be split into username / password
+	"""
+
+
+class AddressError(UrlParseError):
+	"""
+		IPv4 / IPv6 host that matched a pattern but can't be converted
+	"""
+
+
+#Structured error record, stage that failed, what went wrong and the offset into the cleaned url
+ParseIssue = collections.namedtuple('ParseIssue', ('stage', 'reason', 'offset'))
+
+#Reasons of the errors the parse stages record, and the error strict parsing raises for them
+NO_HOST 			= 'unable to determine host, stopping parser'
+BAD_CREDENTIALS 	= "more than one ':' in credentials"
+BAD_IPV4 			= 'unable to convert ipv4 address'
+BAD_IPV6 			= 'unable to convert ipv6 address'
+ERROR_TYPES 		= {NO_HOST: NoHostError, BAD_CREDENTIALS: CredentialError, BAD_IPV4: AddressError, BAD_IPV6: AddressError}
+
+
+#inet_aton style IPv4 address, 1 to 4 parts of hex (0x), octal (leading 0) or decimal
+IPV4_ATON 		= re.compile(r'(?:(?:0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)\.){0,3}(?:0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)')
+#Largest value of the last part, by number of parts (a / a.b / a.b.c / a.b.c.d)
+IPV4_PART_MAX 	= (0, 0xffffffff, 0xffffff, 0xffff, 0xff)
+#Runs of two or more zero words in ':w0:w1:...:w7:'
+IPV6_ZERO_RUN 	= re.compile(r'(?<=:)0(?::0)+(?=:)')
+
+
+def inetAtonPart(part):
+	"""
+		Returns the value of one inet_aton address part
+	"""
+	if part[1:2] in ('x', 'X'):	return int(part, 16)
+	if part[:1] == '0':			return int(part, 8)
+	return int(part)
+
+
+def inetAton(address):
+	"""
+		Parse an IPv4 address the way inet_aton does, parts may be decimal, octal or hex
+		a.b.c.d, a.b.c (c is 16 bits), a.b (b is 24 bits) or a (32 bits)
+
+		Returns the address as an integer, raises ValueError when it isn't valid
+	"""
+	if not IPV4_ATON.fullmatch(address):
+		raise ValueError('%r is not a valid IPv4 address' % (address,))
+
+	parts 	= address.split('.')
+	value 	= 0
+	for part in parts[:-1]:
+		partValue = inetAtonPart(part)
+		if partValue > 0xff:
+			raise ValueError('%r is not a valid IPv4 address' % (address,))
+		value = (value << 8) | partValue
+
+	lastValue = inetAtonPart(parts[-1])
+	if lastValue > IPV4_PART_MAX[len(parts)]:
+		raise ValueError('%r is not a valid IPv4 address' % (address,))
+	return (value << (8 * (5 - len(parts)))) | lastValue
+
+
+def ipv4Notation(address):
+	"""
+		Returns the dotted decimal form of an IPv4 address in any inet_aton notation
+		Raises ValueError when it isn't valid
+	"""
+	value = inetAton(address)
+	return '%d.%d.%d.%d' % (value >> 24, (value >> 16) & 0xff, (value >> 8) & 0xff, value & 0xff)
+
+
+def ipv6Standard(value):
+	"""
+		Returns the presentation form of an integer IP address, same text as inet_ntop
+		Values that fit in 32 bits are IPv4, IPv4 mapped IPv6 addresses keep a dotted tail (::ffff:a.b.c.d)
+		The longest run of two or more zero words is compressed to '::', the first one on a tie
+		Raises ValueError for values outside the IPv6 range
+	"""
+	if 0 <= value <= 0xffffffff:
+		return '%d.%d.%d.%d' % (value >> 24, (value >> 16) & 0xff, (value >> 8) & 0xff, value & 0xff)
+	if value >> 128:
+		raise ValueError('%r is not a valid IPv6 address' % (value,))
+	if value >> 32 == 0xffff:
+		return '::ffff:%d.%d.%d.%d' % ((value >> 24) & 0xff, (value >> 16) & 0xff, (value >> 8) & 0xff, value & 0xff)
+
+	text 	= ':%x:%x:%x:%x:%x:%x:%x:%x:' % (value >> 112, (value >> 96) & 0xffff, (value >> 80) & 0xffff, (value >> 64) & 0xffff,
+											 (value >> 48) & 0xffff, (value >> 32) & 0xffff, (value >> 16) & 0xffff, value & 0xffff)
+	longest = None
+	for zeroRun in IPV6_ZERO_RUN.finditer(text):
+		if longest is None or zeroRun.end() - zeroRun.start() > longest.end() - longest.start():
+			longest = zeroRun
+	if longest is not None:
+		text = text[:longest.start()] + text[longest.end():]
+
+	#Drop the outer ':' unless they are part of '::'
+	if not text.startswith('::'): 	text = text[1:]
+	if not text.endswith('::'): 	text = text[:-1]
+	return text
+
+
+class PatternRegistry:
+	"""
+		PatternRegistry Class
+
+		Holds every regular expression used by the UrlDeconstruction parsers,
+		compiled once when registered instead of on every parser call
+
+		Patterns are grouped by the parser that uses them, within a group the
+		registration order is the match order, first one to match wins
+
+		Host patterns (ipv6, ipv4, domain) are registered with registerHost so
+		they can also be joined into one alternation, see hostClassifier
+
+		Parsers run patterns at a cursor with match(url, pos, endpos), credential
+		patterns with search(url, pos, endpos), where '^' only matches at 0. A leading
+		'^' is dropped when registering, match already anchors at the cursor, and an
+		anchored credential pattern is matched instead of searched, see anchored()
+		cgi patterns run on the query string on its own and keep their '^'
+	"""
+
+	def __init__(self):
+		#Initialize Variables
+		self._groups 	= {}
+		self._hosts 	= {}
+		self._combined 	= None
+		self._bytes 	= None
+		self._anchored 	= set()
+		self.version 	= 0
+
+	def register(self, group, key, pattern, flags=0, before=None):
+		"""
+			Compile pattern and add it to group under key, without a leading '^' (see class notes)
+			Replaces an existing key in place, before=<key> inserts ahead of that key
+
+			Returns the compiled pattern
+		"""
+		anchored = group != 'cgi' and pattern[:1] in ('^', b'^')
+		if anchored:
+			pattern = pattern[1:]
+			self._anchored.add((group, key))
+		else:
+			self._anchored.discard((group, key))
+		compiled 	= re.compile(pattern, flags)
+		patterns 	= self._groups.setdefault(group, {})
+		self._hosts.pop((group, key), None)
+		self._combined 	= None
+		self.version 	+= 1
+		if before is not None and key not in patterns:
+			if before not in patterns:
+				raise KeyError("Unknown pattern '%s' in group '%s'" % (before, group))
+			ordered = {}
+			for existKey, existPattern in patterns.items():
+				if existKey == before: ordered[key] = compiled
+				ordered[existKey] = existPattern
+			self._groups[group] = ordered
+		else:
+			patterns[key] = compiled
+		return compiled
+
+	def registerHost(self, group, key, hostPattern, flags=0, before=None):
+		"""
+			Register a host pattern, HOST_TAIL is appended for the port / path tail
+			The first group of hostPattern must capture the address
+
+			Returns the compiled pattern
+		"""
+		compiled 					= self.register(group, key, hostPattern + HOST_TAIL, flags, before)
+		self._hosts[(group, key)] 	= (hostPattern[1:] if hostPattern[:1] == '^' else hostPattern, flags)
+		return compiled
+
+	def unregister(self, group, key):
+		"""
+			Remove key from group
+		"""
+		del self._groups[group][key]
+		self._hosts.pop((group, key), None)
+		self._anchored.discard((group, key))
+		self._combined 	= None
+		self.version 	+= 1
+
+	def hostClassifier(self):
+		"""
+			Joins every host pattern, in HOST_GROUPS then registration order, into
+			a single alternation so one match decides the host type
+
+			Returns tuple (pattern, alternatives, portGroup) or None when a host
+			pattern was added with register() and can't be combined
+			alternatives is a list of (group, key, addressGroup) in match order
+		"""
+		if self._combined is None:
+			self._combined = self._buildHostClassifier() or False
+		return self._combined or None
+
+	def _buildHostClassifier(self):
+		"""
+			Build the combined host pattern, see hostClassifier
+		"""
+		inlineFlags 	= {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's', re.VERBOSE: 'x', re.ASCII: 'a'}
+		parts 			= []
+		alternatives 	= []
+		groupCount 		= 0
+		for group in HOST_GROUPS:
+			for key in self._groups.get(group, {}):
+				if (group, key) not in self._hosts:
+					return None
+				(hostPattern, flags) = self._hosts[(group, key)]
+				letters = ''
+				for flag, letter in inlineFlags.items():
+					if flags & flag:
+						letters += letter
+						flags &= ~flag
+				if flags:
+					return None
+				parts.append('(?%s:%s)' % (letters, hostPattern) if letters else '(?:%s)' % hostPattern)
+				alternatives.append((group, key, groupCount + 1))
+				groupCount += re.compile(hostPattern).groups
+		if not parts:
+			return None
+		#HOST_TAIL groups follow the alternatives, port is the second one
+		compiled = re.compile('(?:' + '|'.join(parts) + ')' + HOST_TAIL)
+		return (compiled, alternatives, groupCount + 2)
+
+	def bytesRegistry(self):
+		"""
+			Returns a registry with every pattern compiled for bytes, rebuilt when this one changes
+			or None when a pattern has no bytes form (non ASCII text, str only escapes)
+			cgi patterns stay str, they are run on the decoded query
+		"""
+		if self._bytes is None or self._bytes[0] != self.version:
+			self._bytes = (self.version, self._buildBytesRegistry())
+		return self._bytes[1]
+
+	def _buildBytesRegistry(self):
+		"""
+			Build the bytes registry, see bytesRegistry
+		"""
+		toBytes 	= lambda compiled: re.compile(compiled.pattern.encode('ascii'), compiled.flags & ~re.UNICODE)
+		registry 	= PatternRegistry()
+		try:
+			for group, patterns in self._groups.items():
+				registry._groups[group] = {key: toBytes(compiled) for key, compiled in patterns.items()} if group != 'cgi' else dict(patterns)
+			registry._anchored 	= self._anchored
+			classifier 			= self.hostClassifier()
+			registry._combined 	= (toBytes(classifier[0]),) + classifier[1:] if classifier else False
+		except (UnicodeEncodeError, re.error):
+			return None
+		return registry
+
+	def group(self, group):
+		"""
+			Returns the ordered dict of compiled patterns for group
+		"""
+		return self._groups[group]
+
+	def get(self, group, key):
+		"""
+			Returns a single compiled pattern
+		"""
+		return self._groups[group][key]
+
+	def anchored(self, group, key):
+		"""
+			True when the pattern was registered with a leading '^'
+		"""
+		return (group, key) in self._anchored
+
+	def copy(self):
+		"""
+			Returns an independent registry sharing the compiled patterns
+		"""
+		registry 			= PatternRegistry()
+		registry._groups 	= {group: dict(patterns) for group, patterns in self._groups.items()}
+		registry._hosts 	= dict(self._hosts)
+		registry._anchored 	= set(self._anchored)
+		return registry
+
+
+#Host patterns share the same port / path tail, parsers rely on its 3 groups (tail, port, slash)
+HOST_TAIL 	= r'(:([\d]{1,5})(/|$)|/|$)'
+
+#Host pattern groups, in the order urlParseEngine tries them
+HOST_GROUPS = ('ipv6', 'ipv4', 'domain')
+
+#Longest host key UrlDeconstruction keeps in its host cache
+HOST_KEY_LIMIT = 256
+
+#Bytes str.strip() removes, bytes.strip() alone leaves \x1c - \x1f
+ASCII_WHITESPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+#LatencyHistogram bucket upper bounds in seconds, per request and per parse stage
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS 	= (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001, 0.01)
+
+#Built-in scheme and credential patterns, the named host fast path and scanCredential's '@' check rely on them
+SCHEME_PATTERN 		= r'([\w-]*)://'
+CREDENTIAL_PATTERN 	= r'([\w]*):([\w]*)@|([a-z0-9]*)@'
+
+#Urls the prefilter classifies at a time in parse_many(compact=True) and parse_columns
+PREFILTER_BLOCK 	= 1024
+
+#Ports ParsedUrl.canonical drops, by scheme
+DEFAULT_PORTS 		= {'http://': '80', 'https://': '443', 'ws://': '80', 'wss://': '443', 'ftp://': '21'}
+#ParsedUrl.canonical, escapes of unreserved characters are decoded, other escapes kept (upper case hex)
+#and characters outside unreserved / sub-delims / ':@/?' quoted, text matching CANONICAL_PLAIN has nothing to change
+CANONICAL_UNRESERVED 	= frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+CANONICAL_ESCAPE 		= re.compile(r"%[0-9A-Fa-f]{2}|[^A-Za-z0-9\-._~!$&'()*+,;=:@/?]")
+CANONICAL_PLAIN 		= re.compile(r'[\w\-./~]*\Z', re.ASCII)
+CANONICAL_PARAM_SEP 	= re.compile(r'[&;]')
+PERCENT_ESCAPE 			= re.compile(r'%[0-9A-Fa-f]{2}')
+#Bytes of the blake2b digest ParsedUrl.canonicalKey returns
+CANONICAL_KEY_SIZE 	= 16
+#Urls the dedup filters are sized for, and the BloomFilter false positive rate
+DEDUP_CAPACITY 		= 10000000
+DEDUP_ERROR_RATE 	= 0.001
+
+#Module level registry, compiled at import
+PATTERNS 	= PatternRegistry()
+
+#IPv4 - Standard Dotted Notation
+PATTERNS.registerHost('ipv4', 'DotNot', r'((?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?))')
+#IPv4 - Dotted Hexadecimal
+PATTERNS.registerHost('ipv4', 'DotHex', r'(0x[A-F0-9]{2}\.0x[A-F0-9]{2}\.0x[A-F0-9]{2}\.0x[A-F0-9]{2})', re.IGNORECASE)
+#IPv4 - Dotted Octal
+PATTERNS.registerHost('ipv4', 'DotOct', r'([\d]{4}\.[\d]{4}\.[\d]{4}\.[\d]{4})')
+#IPv4 - Hexadecimal
+PATTERNS.registerHost('ipv4', 'HexDec', r'(0x[\dA-F]{8})', re.IGNORECASE)
+#IPv4 - Octal
+PATTERNS.registerHost('ipv4', 'Oct', r'([\d]{12})')
+#IPv4 - Decimal
+PATTERNS.registerHost('ipv4', 'Dec', r'([\d]{10})')
+
+#IPv6 - Standard and Abbv Version
+PATTERNS.registerHost('ipv6', 'Std', r'\[([0-9a-f:%\./]*)\]', re.IGNORECASE)
+#IPv6 - Oct
+PATTERNS.registerHost('ipv6', 'Oct', r'([\d]{39})', re.IGNORECASE)
+
+#Domain
+PATTERNS.registerHost('domain', 'Dom', r'([\w\-\.]*\.[\w]*)', re.IGNORECASE)
+PATTERNS.registerHost('domain', 'Loc', r'([\w\-\.]{1,}[a-z]{1})', re.IGNORECASE)
+PATTERNS.registerHost('domain', 'Hst', r'(localhost)', re.IGNORECASE)
+
+#Scheme, Credentials, Path, CGI
+PATTERNS.register('scheme', 'Scheme', SCHEME_PATTERN)
+PATTERNS.register('credential', 'Creds', CREDENTIAL_PATTERN)
+PATTERNS.register('path', 'Path', r'([\w\./\(\,)\-]*)')
+PATTERNS.register('cgi', 'CGI', r'([\w\-\.]+)[:= ] ?"?([\w\-\.\+\(\)\s:\/]+)"?|^([\w\-\.]*)|;([\w\-\.]*)$')
+
+
+#Prebuilt PublicSuffixList files are JSON documents with this format name
+PSL_FORMAT 		= 'urlParser-psl'
+#PublicSuffixList loaded per path, so worker processes read each file once
+_suffixLists 	= {}
+
+#Leading address bits CidrTrie.lookup looks up in a table instead of walking the trie
+CIDR_JUMP_BITS 		= 16
+#Blocklist snapshots start with these bytes and a version byte, load() reads this version only
+BLOCKLIST_MAGIC 	= b'urlParser-blocklist\x00'
+BLOCKLIST_VERSION 	= 1
+#Sections of a snapshot, header, rules, rule lists, domains, domain codes and 5 per CidrTrie
+BLOCKLIST_SECTIONS 	= 15
+#Domain rules, dot separated labels of letters, digits, '-' and '_' (idna form), the last one not all digits
+BLOCKLIST_DOMAIN 	= re.compile(r'(?:(?!-)[a-z0-9_-]{1,63}(?<!-)\.)*(?!-)(?![0-9]+\Z)[a-z0-9_-]{1,63}(?<!-)\Z')
+#Addresses hosts files point blocked names at, '0.0.0.0 domain.com'
+HOSTS_FILE_SINKS 	= frozenset(('0.0.0.0', '127.0.0.1', '::', '::1'))
+#(file stamps, Blocklist) loaded per path (tuple of paths), so worker processes read each list once
+_blocklists 		= {}
+
+
+class PublicSuffixList:
+	"""
+		PublicSuffixList Class
+
+		Public Suffix List (https://publicsuffix.org/list/) rules in a trie of reversed labels,
+		com -> co -> ... so finding the suffix of a domain walks each of its labels once
+		A node is a dict of label -> node, '$' marks the end of a rule and '!' an exception rule,
+		'*' children are wildcard rules. Domains no rule matches end in their last label
+
+		load() reads the list text or the prebuilt JSON form save() writes, which skips
+		parsing the rules when a script starts
+	"""
+
+	def __init__(self, trie=None):
+		#Initialize Variables
+		self._trie = trie if trie is not None else {}
+
+	def __len__(self):
+		#Number of rules
+		count 	= 0
+		nodes 	= [self._trie]
+		while nodes:
+			node 	= nodes.pop()
+			count 	+= ('$' in node) + ('!' in node)
+			nodes.extend(child for label, child in node.items() if type(child) is dict)
+		return count
+
+	def addRule(self, rule):
+		"""
+			Add one rule of the list, 'co.uk', '*.ck' or '!www.ck'
+			Internationalized rules are added in their unicode and punycode forms
+		"""
+		rule 		= rule.lower()
+		exception 	= rule.startswith('!')
+		forms 		= [rule.lstrip('!')]
+		if not forms[0].isascii():
+			try:
+				forms.append('.'.join(label.encode('idna').decode('ascii') if label != '*' else label for label in forms[0].split('.')))
+			except UnicodeError:
+				pass
+		for form in forms:
+			node = self._trie
+			for label in reversed(form.split('.')):
+				node = node.setdefault(label, {})
+			node['!' if exception else '$'] = 1
+
+	def suffixStart(self, fqdn):
+		"""
+			Returns the offset of the public suffix in fqdn, 0 when fqdn is a public suffix itself
+			Labels are compared without case
+		"""
+		name 		= fqdn.lower()
+		node 		= self._trie
+		end 		= len(name)
+		#Implicit '*' rule, the last label
+		start 		= name.rfind('.') + 1
+		while node is not None:
+			dot 		= name.rfind('.', 0, end)
+			child 		= node.get(name[dot+1:end])
+			wildcard 	= node.get('*')
+			#Exception, the suffix is the rule without its first label
+			if child is not None and '!' in child:
+				return end + 1
+			if (child is not None and '$' in child) or (wildcard is not None and '$' in wildcard):
+				start = dot + 1
+			if dot == -1:
+				break
+			node 	= child if child is not None else wildcard
+			end 	= dot
+		return start
+
+	def publicSuffix(self, fqdn):
+		"""
+			Returns the public suffix of fqdn, 'co.uk' for 'www.domain.co.uk'
+		"""
+		return fqdn[self.suffixStart(fqdn):]
+
+	def save(self, path):
+		"""
+			Write the prebuilt JSON form, load() reads it back without parsing rules
+		"""
+		with open(path, 'w', encoding='utf-8') as pslFile:
+			json.dump({'format': PSL_FORMAT, 'version': 1, 'trie': self._trie}, pslFile, separators=(',', ':'), ensure_ascii=False)
+
+	@classmethod
+	def fromText(cls, lines, private=True):
+		"""
+			Build from the lines of public_suffix_list.dat, private=False stops at the private domains section
+		"""
+		suffixList = cls()
+		for line in lines:
+			line = line.strip()
+			if not line or line.startswith('//'):
+				if not private and 'BEGIN PRIVATE DOMAINS' in line:
+					break
+				continue
+			suffixList.addRule(line.split()[0])
+		return suffixList
+
+	@classmethod
+	def load(cls, path, private=True):
+		"""
+			Read a PublicSuffixList from the list text or the prebuilt JSON form
+		"""
+		with open(path, encoding='utf-8') as pslFile:
+			text = pslFile.read()
+		if text.lstrip().startswith('{'):
+			document = json.loads(text)
+			if document.get('format') != PSL_FORMAT:
+				raise ValueError("%s is not a prebuilt public suffix list" % (path,))
+			return cls(document['trie'])
+		return cls.fromText(text.splitlines(), private)
+
+
+def loadSuffixList(psl):
+	"""
+		Returns the PublicSuffixList for psl, a PublicSuffixList or the path of one, see PublicSuffixList.load
+		Lists read from a path are kept, loading the same path again costs nothing
+	"""
+	if psl is None or isinstance(psl, PublicSuffixList):
+		return psl
+	if psl not in _suffixLists:
+		_suffixLists[psl] = PublicSuffixList.load(psl)
+	return _suffixLists[psl]
+
+
+class CidrTrie:
+	"""
+		CidrTrie Class
+
+		Path compressed binary radix trie of the networks of one address family, width 32 or 128 bits
+		Node i covers the first lengths[i] bits of keys[i], its children branch on the next bit
+		and rules[i] is the rule index of the network it stands for, -1 for branch nodes
+		Finding the longest matching network visits at most one node per address bit, a table of the
+		first CIDR_JUMP_BITS bits, built on the first lookup, skips the nodes above that
+	"""
+
+	__slots__ = ('width', 'lengths', 'keys', 'left', 'right', 'rules', '_jumpNodes', '_jumpRules')
+
+	def __init__(self, width=32):
+		#Initialize Variables, node 0 is the root, the 0 bit network
+		self.width 		= width
+		self.lengths 	= array.array('B', [0])
+		self.keys 		= [0]
+		self.left 		= array.array('i', [-1])
+		self.right 		= array.array('i', [-1])
+		self.rules 		= array.array('i', [-1])
+		self._jumpNodes = None
+		self._jumpRules = None
+
+	def __len__(self):
+		#Number of networks
+		return len(self.rules) - self.rules.count(-1)
+
+	def newNode(self, key, length, rule=-1):
+		self.lengths.append(length)
+		self.keys.append(key)
+		self.left.append(-1)
+		self.right.append(-1)
+		self.rules.append(rule)
+		return len(self.keys) - 1
+
+	def insert(self, network, length, rule):
+		"""
+			Add network / length for rule, returns False when that network was already there
+		"""
+		width 	= self.width
+		network &= ~((1 << (width - length)) - 1)
+		node 	= 0
+		self._jumpNodes = self._jumpRules = None
+		while True:
+			nodeLength = self.lengths[node]
+			if nodeLength == length:
+				if self.rules[node] != -1:
+					return False
+				self.rules[node] = rule
+				return True
+			children 	= self.right if (network >> (width - 1 - nodeLength)) & 1 else self.left
+			child 		= children[node]
+			if child == -1:
+				children[node] = self.newNode(network, length, rule)
+				return True
+
+			#Bits the network shares with the child
+			childLength = self.lengths[child]
+			childKey 	= self.keys[child]
+			common 		= min(width - (network ^ childKey).bit_length(), length, childLength)
+			if common == childLength:
+				node = child
+				continue
+
+			#Split the edge, a branch node (or the network itself) takes the child's place
+			middle 			= self.newNode(network & ~((1 << (width - common)) - 1), common, rule if common == length else -1)
+			children[node] 	= middle
+			if (childKey >> (width - 1 - common)) & 1:
+				self.right[middle] = child
+			else:
+				self.left[middle] = child
+			if common != length:
+				leaf = self.newNode(network, length, rule)
+				if (network >> (width - 1 - common)) & 1:
+					self.right[middle] = leaf
+				else:
+					self.left[middle] = leaf
+			return True
+
+	def lookup(self, address):
+		"""
+			Returns the rule index of the longest network holding address, -1 when none does
+		"""
+		if self._jumpNodes is None:
+			self.buildJump()
+		(width, lengths, keys, left, right, rules) = (self.width, self.lengths, self.keys, self.left, self.right, self.rules)
+		prefix 	= address >> (width - CIDR_JUMP_BITS)
+		node 	= self._jumpNodes[prefix]
+		best 	= self._jumpRules[prefix]
+		while True:
+			length = lengths[node]
+			if length == width:
+				return best
+			node = right[node] if (address >> (width - 1 - length)) & 1 else left[node]
+			#Child networks that don't hold address end the walk
+			if node == -1 or (address ^ keys[node]) >> (width - lengths[node]):
+				return best
+			if rules[node] != -1:
+				best = rules[node]
+
+	def buildJump(self):
+		"""
+			Fill the jump table, for each value of the first CIDR_JUMP_BITS bits the deepest node
+			no longer than that which holds them, and the rule of the longest network on the way
+		"""
+		(width, bits) 	= (self.width, CIDR_JUMP_BITS)
+		jumpNodes 		= array.array('i', [0]) * (1 << bits)
+		jumpRules 		= array.array('i', [self.rules[0]]) * (1 << bits)
+		#Parents are filled in before their children, which overwrite the part they hold
+		stack = [(child, self.rules[0]) for child in (self.left[0], self.right[0]) if child != -1]
+		while stack:
+			(node, best) = stack.pop()
+			length = self.lengths[node]
+			if length > bits:
+				continue
+			if self.rules[node] != -1:
+				best = self.rules[node]
+			start = self.keys[node] >> (width - bits)
+			count = 1 << (bits - length)
+			jumpNodes[start:start+count] = array.array('i', [node]) * count
+			jumpRules[start:start+count] = array.array('i', [best]) * count
+			stack.extend((child, best) for child in (self.left[node], self.right[node]) if child != -1)
+		(self._jumpNodes, self._jumpRules) = (jumpNodes, jumpRules)
+
+
+class Blocklist:
+	"""
+		Blocklist Class
+
+		IP / CIDR and domain rules of one or more lists, matched against parsed hosts
+		Networks go in a CidrTrie per address family, the longest network holding an address wins
+		Domains are a suffix trie of reversed labels, flattened into a dict keyed by each rule's domain,
+		so matching walks the labels of a host from the full name down to its last label, the
+		longest matching suffix wins. 'domain.com' matches the domain and every subdomain of it,
+		'*.domain.com' only the subdomains
+
+		save() writes a binary snapshot that load() reads back without parsing the lists
+	"""
+
+	def __init__(self):
+		#Initialize Variables, domain codes are rule index * 2 + 1 for subdomain only rules
+		self.rules 		= []
+		self.ruleLists 	= array.array('i')
+		self.lists 		= []
+		self.ipv4 		= CidrTrie(32)
+		self.ipv6 		= CidrTrie(128)
+		self.domains 	= {}
+		self.skipped 	= 0
+
+	def __len__(self):
+		return len(self.rules)
+
+	def add(self, entry, listName=None):
+		"""
+			Add one rule, an address, a network ('10.0.0.0/8', '2001:db8::/32'), a domain or '*.' domain
+			Returns False when the same rule was already added, raises ValueError for entries that are none of them
+		"""
+		rule 				= entry.strip().lower()
+		(address, sep, bits) = rule.partition('/')
+		address 			= address.strip('[]')
+		for (family, trie) in ((socket.AF_INET, self.ipv4), (socket.AF_INET6, self.ipv6)):
+			try:
+				packed = socket.inet_pton(family, address)
+			except OSError:
+				continue
+			length = int(bits) if bits.isdigit() else trie.width
+			if sep and not bits.isdigit() or length > trie.width:
+				raise ValueError('%r is not a valid network' % (entry,))
+			if not trie.insert(int.from_bytes(packed, 'big'), length, len(self.rules)):
+				return False
+			return self.addRule(rule, listName)
+
+		wildcard 	= rule.startswith('*.')
+		domain 		= rule[2:] if wildcard else rule
+		domain 		= domain.strip('.')
+		forms 		= [domain]
+		if not domain.isascii():
+			try:
+				forms.append(domain.encode('idna').decode('ascii'))
+			except UnicodeError:
+				forms = []
+		if sep or len(domain) > 253 or not forms or not BLOCKLIST_DOMAIN.match(forms[-1]):
+			raise ValueError('%r is not an address, network or domain' % (entry,))
+		code = len(self.rules) * 2 + wildcard
+		#A domain rule covers the subdomain only rule of the same domain
+		if domain in self.domains and (wildcard or not self.domains[domain] & 1):
+			return False
+		for form in forms:
+			self.domains[form] = code
+		return self.addRule(rule, listName)
+
+	def addRule(self, rule, listName):
+		if listName not in self.lists:
+			self.lists.append(listName)
+		self.rules.append(rule)
+		self.ruleLists.append(self.lists.index(listName))
+		return True
+
+	def addLines(self, lines, listName=None):
+		"""
+			Add the rules of a list, one per line, '#' and ';' start a comment
+			Hosts file lines ('0.0.0.0 domain.com other.com', see HOSTS_FILE_SINKS) add their domains,
+			lines that hold anything else, or a rule that isn't valid, are counted in skipped
+		"""
+		for line in lines:
+			fields = line.partition('#')[0].partition(';')[0].split()
+			if not fields:
+				continue
+			if len(fields) > 1:
+				if fields[0] not in HOSTS_FILE_SINKS:
+					self.skipped += 1
+					continue
+				fields = fields[1:]
+			for entry in fields:
+				try:
+					self.add(entry, listName)
+				except ValueError:
+					self.skipped += 1
+		return self
+
+	def annotation(self, index):
+		return {'rule': self.rules[index], 'list': self.lists[self.ruleLists[index]]} if index != -1 else None
+
+	def matchAddress(self, address):
+		"""
+			Returns the rule index of the network holding an ipv4 / ipv6 address (text), -1 when none does
+			IPv4 mapped IPv6 addresses (::ffff:a.b.c.d) are matched against the ipv4 networks as well
+		"""
+		try:
+			if ':' not in address:
+				return self.ipv4.lookup(int.from_bytes(socket.inet_aton(address), 'big'))
+			value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+		except OSError:
+			return -1
+		index = self.ipv6.lookup(value)
+		if index == -1 and value >> 32 == 0xffff:
+			index = self.ipv4.lookup(value & 0xffffffff)
+		return index
+
+	def matchDomain(self, fqdn):
+		"""
+			Returns the rule index of the longest domain rule matching fqdn, -1 when none does
+		"""
+		domains = self.domains
+		name 	= fqdn.lower().rstrip('.')
+		code 	= domains.get(name)
+		if code is not None and not code & 1:
+			return code >> 1
+		dot = name.find('.')
+		while dot != -1:
+			code = domains.get(name[dot+1:])
+			if code is not None:
+				return code >> 1
+			dot = name.find('.', dot + 1)
+		return -1
+
+	def match(self, host, group=None):
+		"""
+			Returns {'rule': rule, 'list': list name} for the rule matching a host, None when none does
+			group is 'ipv4', 'ipv6' or 'domain', worked out from host when not given
+		"""
+		if group is None:
+			group = 'domain' if any(character.isalpha() for character in host) and ':' not in host else 'ip'
+		return self.annotation(self.matchDomain(host) if group == 'domain' else self.matchAddress(host))
+
+	def save(self, path):
+		"""
+			Write the binary snapshot, BLOCKLIST_MAGIC and BLOCKLIST_VERSION followed by length prefixed sections
+		"""
+		sections = [json.dumps({'rules': len(self.rules), 'lists': self.lists, 'skipped': self.skipped}).encode('utf-8'),
+					'\n'.join(self.rules).encode('utf-8'), self.ruleLists.tobytes(),
+					'\n'.join(self.domains).encode('utf-8'), array.array('i', self.domains.values()).tobytes()]
+		for trie in (self.ipv4, self.ipv6):
+			keySize = trie.width // 8
+			sections.extend((trie.lengths.tobytes(), trie.left.tobytes(), trie.right.tobytes(), trie.rules.tobytes(),
+							 b''.join(key.to_bytes(keySize, 'big') for key in trie.keys)))
+		with open(path, 'wb') as snapshotFile:
+			snapshotFile.write(BLOCKLIST_MAGIC + bytes((BLOCKLIST_VERSION,)))
+			for section in sections:
+				snapshotFile.write(len(section).to_bytes(8, 'little'))
+				snapshotFile.write(section)
+
+	@classmethod
+	def fromText(cls, lines, listName=None):
+		"""
+			Build from the lines of a list, see addLines
+		"""
+		return cls().addLines(lines, listName)
+
+	@classmethod
+	def load(cls, path, listName=None):
+		"""
+			Read a Blocklist from a save() snapshot or a list, listName defaults to the file name
+			Raises ValueError for snapshots of another BLOCKLIST_VERSION and for damaged ones
+		"""
+		with open(path, 'rb') as listFile:
+			data = listFile.read()
+		if not data.startswith(BLOCKLIST_MAGIC):
+			return cls.fromText(data.decode('utf-8', 'replace').splitlines(), listName or os.path.basename(path))
+		if len(data) == len(BLOCKLIST_MAGIC):
+			raise ValueError('%s is a damaged blocklist snapshot, it has no version' % (path,))
+		if data[len(BLOCKLIST_MAGIC)] != BLOCKLIST_VERSION:
+			raise ValueError('%s is a version %d blocklist snapshot, version %d is supported, save it again'
+							 % (path, data[len(BLOCKLIST_MAGIC)], BLOCKLIST_VERSION))
+		try:
+			return cls.fromSnapshot(data, len(BLOCKLIST_MAGIC) + 1)
+		except (ValueError, KeyError, TypeError, IndexError) as err:
+			raise ValueError('%s is a damaged blocklist snapshot, %s' % (path, err)) from None
+
+	@classmethod
+	def fromSnapshot(cls, data, pos):
+		"""
+			Build from the sections of a snapshot starting at pos, checking they fit together
+		"""
+		#Snapshot sections, in save() order
+		sections = []
+		while pos < len(data):
+			size = int.from_bytes(data[pos:pos+8], 'little')
+			if pos + 8 + size > len(data):
+				raise ValueError('section %d is cut short' % (len(sections),))
+			sections.append(data[pos+8:pos+8+size])
+			pos += 8 + size
+		if len(sections) != BLOCKLIST_SECTIONS:
+			raise ValueError('%d sections instead of %d' % (len(sections), BLOCKLIST_SECTIONS))
+		blocklist 			= cls()
+		header 				= json.loads(sections[0].decode('utf-8'))
+		blocklist.lists 	= header['lists']
+		blocklist.skipped 	= header['skipped']
+		blocklist.rules 	= sections[1].decode('utf-8').split('\n') if header['rules'] else []
+		blocklist.ruleLists = array.array('i', sections[2])
+		codes 				= array.array('i', sections[4])
+		blocklist.domains 	= dict(zip(sections[3].decode('utf-8').split('\n'), codes)) if codes else {}
+		for (trie, offset) in ((blocklist.ipv4, 5), (blocklist.ipv6, 10)):
+			keySize 		= trie.width // 8
+			trie.lengths 	= array.array('B', sections[offset])
+			trie.left 		= array.array('i', sections[offset + 1])
+			trie.right 		= array.array('i', sections[offset + 2])
+			trie.rules 		= array.array('i', sections[offset + 3])
+			keys 			= sections[offset + 4]
+			trie.keys 		= [int.from_bytes(keys[pos:pos+keySize], 'big') for pos in range(0, len(keys), keySize)]
+			size 			= len(trie.lengths)
+			if (len(trie.left), len(trie.right), len(trie.rules), len(keys)) != (size, size, size, size * keySize) or \
+				size and (max(trie.left) >= size or max(trie.right) >= size or max(trie.rules) >= len(blocklist.rules) or max(trie.lengths) > trie.width):
+				raise ValueError('the ipv%d trie doesn\'t fit together' % (4 if trie.width == 32 else 6,))
+
+		#Every rule index has to point at a rule
+		if len(blocklist.rules) != header['rules'] or len(blocklist.ruleLists) != header['rules'] or len(blocklist.domains) != len(codes):
+			raise ValueError('the rule counts don\'t match')
+		if blocklist.ruleLists and max(blocklist.ruleLists) >= len(blocklist.lists) or codes and max(codes) >= 2 * len(blocklist.rules):
+			raise ValueError('a rule points past the rules')
+		return blocklist
+
+
+def loadBlocklist(blocklist):
+	"""
+		Returns the Blocklist for blocklist, a Blocklist, the path of a list or snapshot, or a list of paths
+		merged into one, see Blocklist.load. Lists read from paths are kept until one of the files changes
+		(modification time or size), loading them again costs a stat per file
+	"""
+	if blocklist is None or isinstance(blocklist, Blocklist):
+		return blocklist
+	paths 	= (blocklist,) if isinstance(blocklist, str) else tuple(blocklist)
+	stamps 	= tuple((status.st_mtime_ns, status.st_size) for status in map(os.stat, paths))
+	cached 	= _blocklists.get(paths)
+	if cached is None or cached[0] != stamps:
+		if len(paths) == 1:
+			merged = Blocklist.load(paths[0])
+		else:
+			#Rules of every list are added again, the first list holding a rule keeps it
+			merged = Blocklist()
+			for path in paths:
+				blocklist = Blocklist.load(path)
+				for (rule, listIndex) in zip(blocklist.rules, blocklist.ruleLists):
+					merged.add(rule, blocklist.lists[listIndex])
+				merged.skipped += blocklist.skipped
+		cached = _blocklists[paths] = (stamps, merged)
+	return cached[1]
+
+
+class LruCache:
+	"""
+		LruCache Class
+
+		Bounded mapping that drops the least recently used entry when full,
+		counts hits, misses and evictions, safe to share between threads
+	"""
+
+	def __init__(self, maxSize=4096):
+		#Initialize Variables
+		self.maxSize 	= maxSize
+		self.hits 		= 0
+		self.misses 	= 0
+		self.evictions 	= 0
+		self._entries 	= collections.OrderedDict()
+		self._lock 		= threading.Lock()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, default=None):
+		"""
+			Returns the value stored for key and marks it most recently used, default on a miss
+		"""
+		with self._lock:
+			try:
+				value = self._entries[key]
+			except KeyError:
+				self.misses += 1
+				return default
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		"""
+			Store value for key, evicting the least recently used entry when full
+		"""
+		with self._lock:
+			self._entries[key] = value
+			self._entries.move_to_end(key)
+			if len(self._entries) > self.maxSize:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def clear(self, counters=True):
+		"""
+			Drop every entry, and reset the counters unless counters=False
+		"""
+		with self._lock:
+			self._entries.clear()
+			if counters:
+				self.hits = self.misses = self.evictions = 0
+
+	def stats(self):
+		"""
+			Returns dict of size, maxSize, hits, misses, evictions and hitRate
+		"""
+		lookups = self.hits + self.misses
+		return {'size': len(self._entries), 'maxSize': self.maxSize, 'hits': self.hits, 'misses': self.misses,
+				'evictions': self.evictions, 'hitRate': (self.hits / lookups) if lookups else 0.0}
+
+
+class LatencyHistogram:
+	"""
+		LatencyHistogram Class
+
+		Counts observed durations (seconds) into fixed, cumulative buckets
+		like a Prometheus histogram, safe to share between threads
+	"""
+
+	def __init__(self, buckets=LATENCY_BUCKETS):
+		#Initialize Variables
+		self.buckets 	= tuple(buckets)
+		self.counts 	= [0] * (len(self.buckets) + 1)
+		self.count 		= 0
+		self.sum 		= 0.0
+		self._lock 		= threading.Lock()
+
+	def observe(self, seconds):
+		"""
+			Count one duration
+		"""
+		index = bisect.bisect_left(self.buckets, seconds)
+		with self._lock:
+			self.counts[index] 	+= 1
+			self.count 			+= 1
+			self.sum 			+= seconds
+
+	def quantile(self, q):
+		"""
+			Returns the upper bound of the bucket holding quantile q (0 - 1), None when empty
+			or float('inf') when it is past the last bucket
+		"""
+		rank 	= q * self.count
+		seen 	= 0
+		for index, count in enumerate(self.counts):
+			seen += count
+			if count and seen >= rank:
+				return self.buckets[index] if index < len(self.buckets) else float('inf')
+		return None
+
+	def stats(self):
+		"""
+			Returns dict of count, sum and the cumulative count per bucket upper bound ('+Inf' last)
+		"""
+		with self._lock:
+			counts = list(itertools.accumulate(self.counts))
+			return {'count': self.count, 'sum': self.sum,
+					'buckets': dict(zip([repr(bound) for bound in self.buckets] + ['+Inf'], counts))}
+
+	def prometheus(self, name, labels=''):
+		"""
+			Returns the histogram as Prometheus text exposition lines, labels is 'key="value",...'
+		"""
+		stats 	= self.stats()
+		prefix 	= labels + ',' if labels else ''
+		lines 	= ['%s_bucket{%sle="%s"} %d' % (name, prefix, bound, count) for bound, count in stats['buckets'].items()]
+		lines.append('%s_sum%s %r' % (name, '{%s}' % labels if labels else '', stats['sum']))
+		lines.append('%s_count%s %d' % (name, '{%s}' % labels if labels else '', stats['count']))
+		return lines
+
+
+class Instrumentation:
+	"""
+		Instrumentation Class
+
+		Figures collected by UrlDeconstruction.instrument, a LatencyHistogram per
+		stage (unquote, scheme, credential, host, anchor, path, cgi, and parseUrl /
+		deconstruct for whole urls) and how often each host pattern won
+		parseUrl with lazy=True only times the setup, the stages are timed as they run
+	"""
+
+	def __init__(self, buckets=STAGE_BUCKETS):
+		#Initialize Variables
+		self.buckets 	= buckets
+		self.stages 	= {}
+		self.patterns 	= collections.Counter()
+		self._lock 		= threading.Lock()
+
+	def histogram(self, name):
+		"""
+			Returns the LatencyHistogram of stage name, created on first use
+		"""
+		with self._lock:
+			if name not in self.stages:
+				self.stages[name] = LatencyHistogram(self.buckets)
+			return self.stages[name]
+
+	def timed(self, name, function):
+		"""
+			Returns function wrapped to time every call into the name histogram
+		"""
+		observe = self.histogram(name).observe
+		counter = time.perf_counter
+		def timedCall(*args, **kwargs):
+			started = counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				observe(counter() - started)
+		return timedCall
+
+	def counted(self, locateHost):
+		"""
+			Returns locateHost wrapped to count the group / key of the host pattern that won
+		"""
+		patterns 	= self.patterns
+		lock 		= self._lock
+		def countedCall(*args, **kwargs):
+			hostSpan 	= locateHost(*args, **kwargs)
+			patternKey 	= '%s/%s' % hostSpan[:2] if hostSpan is not None else 'none'
+			with lock:
+				patterns[patternKey] += 1
+			return hostSpan
+		return countedCall
+
+	def reset(self):
+		"""
+			Zero every figure, instances instrumented with it keep collecting
+		"""
+		with self._lock:
+			for histogram in self.stages.values():
+				with histogram._lock:
+					histogram.counts 	= [0] * len(histogram.counts)
+					histogram.count 	= 0
+					histogram.sum 		= 0.0
+			self.patterns.clear()
+
+	def stats(self, urld=None):
+		"""
+			Returns JSON friendly dict of the stage timings (calls, seconds, meanUs, buckets)
+			and host pattern counts, with urld's cache counters and hit rates when it is given
+		"""
+		stats = {'stages': {}, 'hostPatterns': {}}
+		for name, histogram in list(self.stages.items()):
+			histogramStats = histogram.stats()
+			stats['stages'][name] = {'calls': histogramStats['count'], 'seconds': histogramStats['sum'],
+									 'meanUs': histogramStats['sum'] / histogramStats['count'] * 1e6 if histogramStats['count'] else 0.0,
+									 'buckets': histogramStats['buckets']}
+		with self._lock:
+			stats['hostPatterns'] = dict(self.patterns.most_common())
+		if urld is not None:
+			stats['caches'] = {'result': urld.cacheStats(), 'host': urld.hostCacheStats()}
+		return stats
+
+	def prometheus(self, urld=None):
+		"""
+			Returns the figures as Prometheus text, with urld's cache counters when it is given
+		"""
+		lines = ['# HELP urlparser_stage_duration_seconds Time spent in each parse stage',
+				 '# TYPE urlparser_stage_duration_seconds histogram']
+		for name, histogram in sorted(self.stages.items()):
+			lines += histogram.prometheus('urlparser_stage_duration_seconds', 'stage="%s"' % name)
+		lines += ['# HELP urlparser_host_pattern_total Hosts matched, by pattern group and key',
+				  '# TYPE urlparser_host_pattern_total counter']
+		with self._lock:
+			for patternKey, count in sorted(self.patterns.items()):
+				(group, sep, key) = patternKey.partition('/')
+				lines.append('urlparser_host_pattern_total{group="%s",key="%s"} %d' % (group, key, count))
+		if urld is not None:
+			lines += cachePrometheus(urld)
+		return '\n'.join(lines) + '\n'
+
+
+def cachePrometheus(urld):
+	"""
+		Returns Prometheus text lines of urld's result and host cache counters, for the caches it has
+	"""
+	lines = []
+	for (cache, stats) in (('result', urld.cacheStats()), ('host', urld.hostCacheStats())):
+		if stats is None: continue
+		for counter in ('hits', 'misses', 'evictions'):
+			lines.append('urlparser_cache_%s_total{cache="%s"} %d' % (counter, cache, stats[counter]))
+		lines.append('urlparser_cache_hit_ratio{cache="%s"} %r' % (cache, stats['hitRate']))
+	return lines
+
+
+def copyComponents(urlComponents):
+	"""
+		Returns a copy of a urlComponents dict, its sub-dicts (domain, cgi, ...) and lists (errors) are copied too
+	"""
+	return {key: (copyComponents(value) if type(value) is dict else copyValues(value) if type(value) is list else value)
+			for key, value in urlComponents.items()}
+
+
+def copyValues(values):
+	"""
+		Returns a copy of a list out of urlComponents, with copies of the dicts / lists in it
+	"""
+	return [(copyComponents(value) if type(value) is dict else copyValues(value) if type(value) is list else value) for value in values]
+
+
+#Query strings parseQuery splits, at most this many parameters from the first this many characters
+QUERY_MAX_PARAMS 	= 1000
+QUERY_MAX_LENGTH 	= 65536
+
+
+class QueryParams:
+	"""
+		QueryParams Class
+
+		Read only multi-dict of the parameters of a query string, see UrlDeconstruction.parseQuery
+		Repeated keys keep every value in order, [key] / get() give the last one like the cgi dict,
+		getall() all of them. With decode=True values are percent / '+' decoded when first read
+		truncated is True when the parameter count or query length cap was reached
+	"""
+
+	__slots__ = ('_keys', '_values', '_decode', '_decoded', '_index', 'truncated')
+
+	def __init__(self, keys, values, decode=False, truncated=False):
+		#Initialize Variables, values stay raw until read
+		self._keys 		= keys
+		self._values 	= values
+		self._decode 	= decode
+		self._decoded 	= None
+		self._index 	= None
+		self.truncated 	= truncated
+
+	def __repr__(self):
+		return 'QueryParams(%r)' % (self.items(),)
+
+	def __eq__(self, other):
+		if not isinstance(other, QueryParams):
+			return NotImplemented
+		return self.items() == other.items()
+
+	__hash__ = None
+
+	def __len__(self):
+		#Number of parameters, repeated keys counted every time
+		return len(self._keys)
+
+	def __iter__(self):
+		#Keys, once each, in order of first appearance
+		return iter(self.index())
+
+	def __contains__(self, key):
+		return key in self.index()
+
+	def __getitem__(self, key):
+		return self.value(self.index()[key][-1])
+
+	def index(self):
+		"""
+			Returns dict of key -> positions of its values, built on the first lookup
+		"""
+		if self._index is None:
+			index = {}
+			for (position, key) in enumerate(self._keys):
+				index.setdefault(key, []).append(position)
+			self._index = index
+		return self._index
+
+	def value(self, position):
+		"""
+			Returns the value at position, decoded when asked for
+		"""
+		value = self._values[position]
+		if not self._decode or ('%' not in value and '+' not in value):
+			return value
+		#Decoded values are kept, the raw ones stay in _values
+		if self._decoded is None:
+			self._decoded = {}
+		if position not in self._decoded:
+			self._decoded[position] = urllib.parse.unquote_plus(value)
+		return self._decoded[position]
+
+	def get(self, key, default=None):
+		positions = self.index().get(key)
+		return self.value(positions[-1]) if positions else default
+
+	def getall(self, key):
+		return [self.value(position) for position in self.index().get(key, ())]
+
+	def keys(self):
+		return list(self.index())
+
+	def items(self):
+		"""
+			Returns list of every (key, value) pair in order
+		"""
+		return [(key, self.value(position)) for (position, key) in enumerate(self._keys)]
+
+	def to_dict(self, multiValue=False):
+		"""
+			Returns the cgi dict, the last value of each key, or every value in a list with multiValue=True
+		"""
+		values = self._values if not self._decode else [self.value(position) for position in range(len(self._values))]
+		if not multiValue:
+			return dict(zip(self._keys, values))
+		multi = {}
+		for (key, value) in zip(self._keys, values):
+			keyValues = multi.get(key)
+			if keyValues is None:
+				multi[key] = [value]
+			else:
+				keyValues.append(value)
+		return multi
+
+
+def canonicalEscape(match):
+	"""
+		CANONICAL_ESCAPE replacement, unreserved characters for their escapes, upper case escapes, quoted characters
+	"""
+	text = match.group()
+	if len(text) == 3:
+		char = chr(int(text[1:], 16))
+		return char if char in CANONICAL_UNRESERVED else text.upper()
+	return urllib.parse.quote(text, safe='')
+
+
+def canonicalText(text):
+	"""
+		Returns credentials, a path or a query key / value of the input url in canonical form, see ParsedUrl.canonical
+	"""
+	#Text with nothing to change is kept as is, the substitution is slow
+	return text if CANONICAL_PLAIN.match(text) else CANONICAL_ESCAPE.sub(canonicalEscape, text)
+
+
+class ParsedUrl:
+	"""
+		ParsedUrl Class
+
+		Compact, read only result of UrlDeconstruction.parseUrl
+		Components are kept as offsets into the cleaned url string (-1 when missing)
+		and only sliced out when read, to_dict() gives the same dict urlParseEngine returns
+
+		The url is walked in stages, scheme -> credential -> host -> anchor -> path,
+		each one starting from the cursor the one before it left. Patterns run on the
+		whole string with pos / endpos, so nothing is copied during the walk. A lazy ParsedUrl runs
+		no stage until a property needs it, then only the stages up to that component,
+		so reading .host never pays for anchor, path or cgi parsing
+		A lazy ParsedUrl changes as it is read, don't share one between threads until to_dict() was called
+
+		Stages that fail record a ParseIssue, see .errors, nothing is raised or printed
+		unless the UrlDeconstruction is strict, then the walk raises the matching UrlParseError
+	"""
+
+	__slots__ = ('_urld', '_input', '_source', '_stages', '_stage', '_pos', '_end', '_warning', '_errors', '_schemeEnd', '_credStart', '_credEnd',
+				 '_hostGroup', '_hostKey', '_hostStart', '_hostEnd', '_portStart', '_portEnd', '_converted',
+				 '_anchorStart', '_pathStart', '_pathEnd')
+
+	#Parse stages, each one needs all the stages before it
+	SCHEME 		= 1
+	CREDENTIAL 	= 2
+	HOST 		= 3
+	ANCHOR 		= 4
+	PATH 		= 5
+
+	#Separators the stages look for, bytes in ParsedBytes
+	_COLON 		= ':'
+	_HASH 		= '#'
+	_SCHEME_END = '://'
+
+	def __init__(self, urld, urlInput, source, stages=None):
+		#Initialize Variables, source is urlInput itself when unquoting changed nothing
+		self._urld 			= urld
+		self._input 		= urlInput
+		self._source 		= source
+		self._stages 		= stages if stages is not None else urld._parseStages
+		self._stage 		= 0
+		self._pos 			= 0
+		self._end 			= -1
+		self._warning 		= None
+		self._errors 		= None
+		self._schemeEnd 	= -1
+		self._credStart 	= -1
+		self._credEnd 		= -1
+		self._hostGroup 	= None
+		self._hostKey 		= None
+		self._hostStart 	= -1
+		self._hostEnd 		= -1
+		self._portStart 	= -1
+		self._portEnd 		= -1
+		self._converted 	= None
+		self._anchorStart 	= -1
+		self._pathStart 	= -1
+		self._pathEnd 		= -1
+
+	def __repr__(self):
+		return 'ParsedUrl(%r)' % (self._input,)
+
+	def __eq__(self, other):
+		if not isinstance(other, ParsedUrl):
+			return NotImplemented
+		return self.to_dict() == other.to_dict()
+
+	__hash__ = None
+
+	def slice(self, start, end):
+		"""
+			Returns the text of the cleaned url between start and end
+		"""
+		return self._source[start:end]
+
+	def advance(self, stage=PATH):
+		"""
+			Run the parse stages up to and including stage, from the saved cursor
+		"""
+		stages 		= self._stages
+		errorCount 	= len(self._errors) if self._errors is not None else 0
+		while self._stage < stage:
+			self._stage += 1
+			stages[self._stage](self)
+		if self._errors is not None and len(self._errors) > errorCount and self._urld._strict:
+			raise self.error(self._errors[errorCount])
+
+	def fail(self, stage, reason, offset):
+		"""
+			Record an error of a parse stage, offset is into the cleaned url
+		"""
+		if self._errors is None:
+			self._errors = []
+		self._errors.append(ParseIssue(stage, reason, offset))
+
+	def error(self, issue):
+		"""
+			Returns the UrlParseError for an error record, holding the components parsed so far
+		"""
+		message = '%s%s at offset %d' % (issue.reason[:1].upper(), issue.reason[1:], issue.offset)
+		return ERROR_TYPES.get(issue.reason, UrlParseError)(message, self.partialDict(), issue.stage, issue.offset)
+
+	def scanScheme(self):
+		"""
+			Stage 1, scheme
+		"""
+		self._end 	= len(self._source)
+		match 		= self._urld._patterns.get('scheme', 'Scheme').match(self._source)
+		if match:
+			self._pos = self._schemeEnd = match.end()
+
+	def scanNamedScheme(self):
+		"""
+			Stage 1 of the named host fast path, the prefilter already saw http:// or https://
+		"""
+		self._end 	= len(self._source)
+		self._pos 	= self._schemeEnd = self._source.find(self._SCHEME_END) + 3
+
+	def skipCredential(self):
+		"""
+			Stage 2 of the named host fast path, urls without '@' have no credentials
+		"""
+
+	def scanCredential(self):
+		"""
+			Stage 2, credentials end at the first '@' match, a user:pass that won't split leaves nothing to parse
+		"""
+		(source, pos) 	= (self._source, self._pos)
+		credEnd 		= self._urld.scanCredential(source, pos, self._end)
+		if credEnd != -1:
+			self._credStart = pos
+			self._credEnd 	= credEnd
+			colonPos 		= source.find(self._COLON, pos, credEnd)
+			if colonPos <= pos or source.count(self._COLON, pos, credEnd) == 1:
+				self._pos = credEnd + 1
+			else:
+				self._pos = self._end
+				self.fail('credential', BAD_CREDENTIALS, source.find(self._COLON, colonPos + 1, credEnd))
+
+	def scanHost(self):
+		"""
+			Stage 3, IPv6/IPv4 and Domain, no host stops the parse
+		"""
+		hostSpan = self._urld.locateHost(self._source, self._pos, self._end)
+		if hostSpan is None:
+			self._warning 	= NO_HOST
+			self._stage 	= ParsedUrl.PATH
+			self.fail('host', NO_HOST, self._pos)
+			return
+
+		(self._hostGroup, self._hostKey, self._hostStart, self._hostEnd, self._portStart, self._portEnd,
+			tailEnd, self._converted) = hostSpan
+		#A conversion error leaves nothing to parse
+		if self._converted is not False:
+			self._pos = tailEnd
+		else:
+			self._pos = self._end
+			self.fail('host', BAD_IPV4 if self._hostGroup == 'ipv4' else BAD_IPV6, self._hostStart)
+
+	def scanAnchor(self):
+		"""
+			Stage 4, anchor runs from the first '#' after the host to the end
+		"""
+		anchorPos = self._source.find(self._HASH, self._pos)
+		if anchorPos != -1:
+			self._anchorStart 	= anchorPos + 1
+			self._end 			= anchorPos
+
+	def scanPath(self):
+		"""
+			Stage 5, path, the character after it (? or ;) is skipped, what is left is the query
+		"""
+		pos 	= self._pos
+		match 	= self._urld._patterns.get('path', 'Path').match(self._source, pos, self._end)
+		if match and match.end(1) > match.start(1):
+			self._pathStart = pos
+			self._pathEnd 	= match.end(1)
+			self._pos 		= min(match.end() + 1, self._end)
+
+	@property
+	def inputUrl(self):
+		return self._input
+
+	@property
+	def cleanUrl(self):
+		"""
+			Unquoted url, None when unquoting changed nothing
+		"""
+		return self._source if self._source is not self._input else None
+
+	@property
+	def warning(self):
+		if self._stage < ParsedUrl.HOST: self.advance(ParsedUrl.HOST)
+		return self._warning
+
+	@property
+	def errors(self):
+		"""
+			Tuple of ParseIssue records, empty when every stage went through
+		"""
+		if self._stage < ParsedUrl.PATH: self.advance(ParsedUrl.PATH)
+		return tuple(self._errors) if self._errors is not None else ()
+
+	@property
+	def scheme(self):
+		if self._stage < ParsedUrl.SCHEME: self.advance(ParsedUrl.SCHEME)
+		return self.slice(0, self._schemeEnd) if self._schemeEnd != -1 else None
+
+	@property
+	def credential(self):
+		"""
+			Credential dict (username / password), {} when the credentials couldn't be split
+		"""
+		if self._stage < ParsedUrl.CREDENTIAL: self.advance(ParsedUrl.CREDENTIAL)
+		if self._credStart == -1:
+			return None
+		credString 	= self.slice(self._credStart, self._credEnd)
+		credential 	= {}
+		#Seperate User:Pass if present
+		if credString.find(':') > 0:
+			credParts = credString.split(':')
+			if len(credParts) == 2:
+				credential['username'] = credParts[0]
+				credential['password'] = credParts[1]
+		else:
+			credential['username'] = credString
+		return credential
+
+	@property
+	def hostGroup(self):
+		"""
+			'ipv4', 'ipv6', 'domain' or None when no host was found
+		"""
+		if self._stage < ParsedUrl.HOST: self.advance(ParsedUrl.HOST)
+		return self._hostGroup
+
+	@property
+	def host(self):
+		"""
+			Address or fqdn as it appears in the url, brackets removed
+		"""
+		if self._stage < ParsedUrl.HOST: self.advance(ParsedUrl.HOST)
+		return self.slice(self._hostStart, self._hostEnd) if self._hostGroup is not None else None
+
+	@property
+	def port(self):
+		if self._stage < ParsedUrl.HOST: self.advance(ParsedUrl.HOST)
+		return self.slice(self._portStart, self._portEnd) if self._portStart != -1 else None
+
+	@property
+	def hostDetails(self):
+		"""
+			The ipv4 / ipv6 / domain dict of urlParseEngine
+		"""
+		if self._stage < ParsedUrl.HOST: self.advance(ParsedUrl.HOST)
+		if self._hostGroup is None:
+			return None
+		details = {}
+		port 	= self.port
+		#Conversion error, only the port was set before it
+		if self._converted is False:
+			if port: details['port'] = port
+			return details
+		return self._urld.hostDetails(details, self._hostGroup, self._hostKey, self.host, port, self._converted)
+
+	@property
+	def anchor(self):
+		if self._stage < ParsedUrl.ANCHOR: self.advance(ParsedUrl.ANCHOR)
+		return self.slice(self._anchorStart, None) if self._anchorStart != -1 else None
+
+	@property
+	def path(self):
+		if self._stage < ParsedUrl.PATH: self.advance(ParsedUrl.PATH)
+		return self.slice(self._pathStart, self._pathEnd) if self._pathStart != -1 else None
+
+	@property
+	def query(self):
+		"""
+			Raw query string left after the path, None when no host was found
+		"""
+		if self._stage < ParsedUrl.PATH: self.advance(ParsedUrl.PATH)
+		return self.slice(self._pos, self._end) if self._hostGroup is not None else None
+
+	@property
+	def cgi(self):
+		"""
+			CGI dict, parsed from the query every time it is read
+		"""
+		query = self.query
+		if query is None:
+			return None
+		urld = self._urld
+		if urld._queryEngine == 'split':
+			params = urld.parseQuery(query)
+			return params.to_dict(urld._multiValue) if len(params) else None
+		(results, newUrlString) = urld.parseCGI(query)
+		return results['cgi'] if results is not None else None
+
+	@property
+	def params(self):
+		"""
+			QueryParams of the query, whichever engine fills cgi, None when no host was found
+		"""
+		query = self.query
+		return self._urld.parseQuery(query) if query is not None else None
+
+	@property
+	def blocked(self):
+		"""
+			{'rule': ..., 'list': ...} of the UrlDeconstruction's blocklist rule matching the host, None without a match
+		"""
+		blocklist = self._urld._blocklist
+		if blocklist is None or self.hostGroup is None or self._converted is False:
+			return None
+		host = self.host
+		if self._hostGroup == 'domain':
+			return blocklist.annotation(blocklist.matchDomain(host))
+		return blocklist.annotation(blocklist.matchAddress(self._converted or host))
+
+	def to_dict(self):
+		"""
+			Returns the urlComponents dict, same keys and order as urlParseEngine
+		"""
+		if self._stage < ParsedUrl.PATH: self.advance(ParsedUrl.PATH)
+		return self.partialDict()
+
+	def partialDict(self):
+		"""
+			to_dict for the stages walked so far, errors are listed under 'errors' when there are any
+		"""
+		urlComponents = {'input_url': self.inputUrl}
+		if self._source is not self._input: 	urlComponents['clean_url'] = self.cleanUrl
+		if self._schemeEnd != -1: 				urlComponents['scheme'] = self.scheme
+		if self._credStart != -1: 				urlComponents['credential'] = self.credential
+		if self._hostGroup is not None:
+			urlComponents[self._hostGroup] = self.hostDetails
+		if self._warning is not None:
+			urlComponents['warning_message'] = self._warning
+		elif self._stage == ParsedUrl.PATH:
+			if self._anchorStart != -1: 		urlComponents['#'] = self.anchor
+			if self._pathStart != -1: 			urlComponents['path'] = self.path
+			cgi = self.cgi
+			if cgi is not None: 				urlComponents['cgi'] = cgi
+		if self._urld._blocklist is not None:
+			blocked = self.blocked
+			if blocked is not None: 			urlComponents['blocklist'] = blocked
+		if self._errors is not None: 			urlComponents['errors'] = [issue._asdict() for issue in self._errors]
+		return urlComponents
+
+	def row(self):
+		"""
+			Returns tuple of the COLUMNS values, None for the components the url doesn't have
+		"""
+		if self._stage < ParsedUrl.PATH: self.advance(ParsedUrl.PATH)
+		credential 	= self.credential or {}
+		group 		= self._hostGroup
+		host 		= self.host
+		address 	= None
+		(subdomain, sld, tld) = (None, None, None)
+		if group == 'domain':
+			(subdomain, sld, tld) = self._urld.splitDomain(host)
+		elif self._converted is not False and group is not None:
+			address = self._converted or (host.lower() if group == 'ipv6' else host)
+		if self._warning is not None:
+			return (self.inputUrl, self.scheme, credential.get('username'), credential.get('password'), group, host, self.port,
+					address, subdomain, sld, tld, None, None, None, self._warning)
+		return (self.inputUrl, self.scheme, credential.get('username'), credential.get('password'), group, host, self.port,
+				address, subdomain, sld, tld, self.path, self.slice(self._pos, self._end), self.anchor, None)
+
+	def canonical(self):
+		"""
+			Returns the canonical form of the url, None when no host was found
+			Scheme and domain are lowercased, ipv4 hosts in dotted notation, ipv6 in standard form,
+			default ports and the anchor are dropped, query parameters sorted by key
+			Credentials, path and query are taken from the input url, not the unquoted one, escapes of
+			unreserved characters are decoded and every other escape kept, so %26 / %3F / %2B stay data
+			and keys without '=' stay bare. A url quoted as a whole (http%3A%2F%2F...) is read unquoted
+		"""
+		if self._stage < ParsedUrl.PATH: self.advance(ParsedUrl.PATH)
+		group = self._hostGroup
+		if group is None or self._warning is not None:
+			return None
+		scheme 	= (self.scheme or '').lower()
+		host 	= self.host
+		if group == 'domain':
+			host = host.lower().rstrip('.')
+		elif self._converted:
+			host = self._converted
+		elif group == 'ipv6':
+			try:
+				host = socket.inet_ntop(socket.AF_INET6, socket.inet_pton(socket.AF_INET6, host))
+			except (OSError, ValueError):
+				host = host.lower()
+		if group == 'ipv6':
+			host = '[' + host + ']'
+
+		#Offsets are into the cleaned url, inputOffset maps them back to the input
+		url 	= self.inputUrl
+		start 	= self._pathStart if self._pathStart != -1 else self._pos
+		offsets = self._source is not self._input
+		if offsets:
+			start = self.inputOffset(url, start)
+			if start == -1:
+				(url, start, offsets) = (self.cleanUrl, self._pathStart if self._pathStart != -1 else self._pos, False)
+		parts = [scheme]
+		if self._credStart != -1:
+			(credStart, credEnd) = (self.inputOffset(url, self._credStart), self.inputOffset(url, self._credEnd)) if offsets else (self._credStart, self._credEnd)
+			parts.append(canonicalText(url[credStart:credEnd]) + '@')
+		parts.append(host)
+		port = self.port
+		if port:
+			port = port.lstrip('0') or '0'
+			if DEFAULT_PORTS.get(scheme) != port:
+				parts.append(':' + port)
+		#Path and query are split at the first '?' of what follows the host, not where the path pattern stops
+		(path, sep, query) = url[start:].partition('#')[0].partition('?')
+		parts.append('/' + canonicalText(path))
+		#'&', ';' and '=' are never changed, so the query is made canonical in one go before the split
+		params = [param for param in CANONICAL_PARAM_SEP.split(canonicalText(query)) if param]
+		if params:
+			if len(params) > 1:
+				params.sort(key=lambda param: param.partition('=')[0])
+			parts.append('?' + '&'.join(params))
+		return ''.join(parts)
+
+	def inputOffset(self, url, position):
+		"""
+			Returns the offset into the input url of an offset into the cleaned url,
+			-1 when the scheme was quoted or a non ASCII escape comes first, unquote merges those
+		"""
+		index = url.find('%', 0, position)
+		if index == -1:
+			return position
+		if self._schemeEnd != -1 and not url.startswith(self.slice(0, self._schemeEnd)):
+			return -1
+		for count in range(index, position):
+			if url[index] == '%' and PERCENT_ESCAPE.match(url, index):
+				if url[index + 1] > '7':
+					return -1
+				index += 3
+			else:
+				index += 1
+		return index
+
+	def canonicalKey(self):
+		"""
+			Returns the CANONICAL_KEY_SIZE bytes blake2b digest of canonical(),
+			of the input url for urls without a host
+		"""
+		canonical = self.canonical()
+		if canonical is None:
+			canonical = self._input if type(self._input) is str else bytes(self._input).decode('utf-8', 'replace')
+		return hashlib.blake2b(canonical.encode('utf-8', 'surrogatepass'), digest_size=CANONICAL_KEY_SIZE).digest()
+
+
+#ParsedUrl stage functions, indexed by stage number
+PARSE_STAGES = (None, ParsedUrl.scanScheme, ParsedUrl.scanCredential, ParsedUrl.scanHost, ParsedUrl.scanAnchor, ParsedUrl.scanPath)
+#Stages of the named host fast path, for urls the prefilter lets through
+NAMED_STAGES = (None, ParsedUrl.scanNamedScheme, ParsedUrl.skipCredential, ParsedUrl.scanHost, ParsedUrl.scanAnchor, ParsedUrl.scanPath)
+#Prefilter, http(s) urls whose host starts with a letter, with nothing to unquote and no credentials
+NAMED_URL 		= re.compile(r'https?://[A-Za-z][^%@]*\Z')
+NAMED_URL_BYTES = re.compile(NAMED_URL.pattern.encode('ascii'))
+#Instrumentation names of the stages, and of the UrlDeconstruction methods it times
+STAGE_NAMES 			= ('scheme', 'credential', 'host', 'anchor', 'path')
+INSTRUMENTED_METHODS 	= (('scheme', 'parseScheme'), ('credential', 'parseCredentials'), ('host', 'parseHost'),
+						   ('anchor', 'parseAnchor'), ('path', 'parsePath'), ('cgi', 'parseCGI'), ('cgi', 'parseQuery'),
+						   ('parseUrl', 'parseUrl'), ('deconstruct', 'deconstruct'))
+
+
+class ParsedBytes(ParsedUrl):
+	"""
+		ParsedBytes Class
+
+		ParsedUrl over an ASCII bytes url, see UrlDeconstruction.parseBytes
+		The stages run bytes patterns on the raw buffer, a component is only
+		decoded to str when it is read
+	"""
+
+	__slots__ = ()
+
+	_COLON 		= b':'
+	_HASH 		= b'#'
+	_SCHEME_END = b'://'
+
+	def __repr__(self):
+		return 'ParsedBytes(%r)' % (self._input,)
+
+	def slice(self, start, end):
+		"""
+			Returns the text of the cleaned url between start and end, decoded
+		"""
+		return self._source[start:end].decode('ascii')
+
+	@property
+	def inputUrl(self):
+		return self._input.decode('ascii')
+
+	@property
+	def cleanUrl(self):
+		"""
+			Unquoted url, None when unquoting changed nothing
+		"""
+		return self._source.decode('ascii') if self._source is not self._input else None
+
+
+#Columns of UrlColumns, in ParsedUrl.row order, address is the ipv4 dotted / ipv6 standard form
+COLUMNS 			= ('input_url', 'scheme', 'username', 'password', 'host_type', 'host', 'port', 'address',
+					   'subdomain', 'sld', 'tld', 'path', 'query', 'anchor', 'warning')
+#Columns with few distinct values, kept as codes into a dictionary of the values
+DICTIONARY_COLUMNS 	= ('scheme', 'host_type', 'port', 'tld', 'warning')
+#Urls per UrlColumns batch when the CLI writes CSV
+COLUMN_BATCH_SIZE 	= 65536
+
+
+class DictionaryColumn:
+	"""
+		DictionaryColumn Class
+
+		Dictionary encoded column, each row is a code into values, -1 for None
+	"""
+
+	__slots__ = ('codes', 'values', '_lookup')
+
+	def __init__(self):
+		#Initialize Variables
+		self.codes 		= array.array('i')
+		self.values 	= []
+		self._lookup 	= {None: -1}
+
+	def __len__(self):
+		return len(self.codes)
+
+	def append(self, value):
+		code = self._lookup.get(value)
+		if code is None:
+			code = self._lookup[value] = len(self.values)
+			self.values.append(value)
+		self.codes.append(code)
+
+	def tolist(self):
+		"""
+			Returns the decoded column
+		"""
+		values = self.values + [None]
+		return [values[code] for code in self.codes]
+
+
+class UrlColumns:
+	"""
+		UrlColumns Class
+
+		Parsed urls kept as one array per column instead of a dict per url, see UrlDeconstruction.parse_columns
+		Columns listed in DICTIONARY_COLUMNS are DictionaryColumn, the others lists
+		to_csv() writes them as CSV, to_numpy() / save_npz() as NumPy arrays (numpy is optional)
+	"""
+
+	def __init__(self, columns=COLUMNS):
+		unknown = [name for name in columns if name not in COLUMNS]
+		if unknown:
+			raise ValueError('unknown columns %s, columns are %s' % (', '.join(unknown), ', '.join(COLUMNS)))
+		#Initialize Variables
+		self.columns 	= tuple(columns)
+		self._data 		= {name: DictionaryColumn() if name in DICTIONARY_COLUMNS else [] for name in self.columns}
+		self._plan 		= tuple((COLUMNS.index(name), self._data[name].append) for name in self.columns)
+
+	def __len__(self):
+		return len(self._data[self.columns[0]]) if self.columns else 0
+
+	def append(self, row):
+		"""
+			Add one ParsedUrl.row()
+		"""
+		for (index, append) in self._plan:
+			append(row[index])
+
+	def raw(self, name):
+		"""
+			Returns the stored column, a list or a DictionaryColumn
+		"""
+		return self._data[name]
+
+	def column(self, name):
+		"""
+			Returns the values of one column as a list
+		"""
+		data = self._data[name]
+		return data.tolist() if type(data) is DictionaryColumn else data
+
+	def rows(self):
+		"""
+			Yields one tuple per url, in column order
+		"""
+		return zip(*(self.column(name) for name in self.columns))
+
+	def to_csv(self, outFile, header=True):
+		"""
+			Write the columns to a text file as CSV, None is written as an empty field
+		"""
+		writer = csv.writer(outFile, lineterminator='\n')
+		if header:
+			writer.writerow(self.columns)
+		writer.writerows(self.rows())
+
+	def to_numpy(self):
+		"""
+			Returns dict of name -> numpy array, strings with None as ''
+			Dictionary columns are int32 codes (-1 for None), with their values under name + '_dictionary'
+		"""
+		try:
+			import numpy
+		except ImportError:
+			raise ImportError('UrlColumns.to_numpy needs numpy, pip3 install numpy')
+		arrays = {}
+		for name in self.columns:
+			data = self._data[name]
+			if type(data) is DictionaryColumn:
+				arrays[name] 					= numpy.frombuffer(data.codes, dtype=numpy.intc) if len(data) else numpy.zeros(0, numpy.intc)
+				arrays[name + '_dictionary'] 	= numpy.array(data.values, dtype=str)
+			else:
+				arrays[name] 					= numpy.array([value if value is not None else '' for value in data], dtype=str)
+		return arrays
+
+	def save_npz(self, path):
+		"""
+			Write to_numpy() to a .npz file, numpy.load reads it back without pickle
+		"""
+		arrays = self.to_numpy()
+		import numpy
+		numpy.savez(path, **arrays)
+
+
+#Fields UrlAggregate counts by default, any COLUMNS name can be counted, plus domain (sld.tld) and cgi_key
+AGGREGATE_FIELDS 	= ('scheme', 'host_type', 'host', 'domain', 'tld', 'port', 'cgi_key')
+#Distinct values a FieldCounter counts exactly, past it the least frequent half is dropped
+AGGREGATE_LIMIT 	= 65536
+#Values listed per field in UrlAggregate.report
+AGGREGATE_TOP 		= 20
+#HyperLogLog registers are 2 ** precision bytes, standard error about 1.04 / sqrt(2 ** precision)
+HLL_PRECISION 		= 14
+#Positions in ParsedUrl.row() of the columns UrlAggregate.add reads itself
+ROW_SLD 			= COLUMNS.index('sld')
+ROW_TLD 			= COLUMNS.index('tld')
+ROW_QUERY 			= COLUMNS.index('query')
+ROW_WARNING 		= COLUMNS.index('warning')
+
+
+class HyperLogLog:
+	"""
+		HyperLogLog Class
+
+		Distinct count estimate in 2 ** precision bytes, values are hashed with blake2b
+		Sketches of the same precision merge into the sketch of both inputs
+	"""
+
+	__slots__ = ('precision', 'registers')
+
+	def __init__(self, precision=HLL_PRECISION):
+		if not 4 <= precision <= 18:
+			raise ValueError('precision must be between 4 and 18, not %r' % (precision,))
+		#Initialize Variables
+		self.precision 	= precision
+		self.registers 	= bytearray(1 << precision)
+
+	def add(self, value):
+		if type(value) is not bytes:
+			value = str(value).encode('utf-8', 'surrogatepass')
+		hashed 	= int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+		bits 	= 64 - self.precision
+		index 	= hashed >> bits
+		rank 	= bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+		if rank > self.registers[index]:
+			self.registers[index] = rank
+
+	def merge(self, other):
+		if other.precision != self.precision:
+			raise ValueError('can\'t merge HyperLogLog of precision %d into %d' % (other.precision, self.precision))
+		self.registers = bytearray(map(max, self.registers, other.registers))
+
+	def count(self):
+		"""
+			Returns the estimated number of distinct values added
+		"""
+		size 		= len(self.registers)
+		estimate 	= 0.7213 / (1 + 1.079 / size) * size * size / sum(2.0 ** -rank for rank in self.registers)
+		zeros 		= self.registers.count(0)
+		#Small cardinalities, linear counting is closer
+		if estimate <= 2.5 * size and zeros:
+			estimate = size * math.log(size / zeros)
+		return int(round(estimate))
+
+
+class FieldCounter:
+	"""
+		FieldCounter Class
+
+		Counts values exactly until more than limit distinct values were seen, then keeps the most
+		frequent ones the Space-Saving way: the least frequent half is dropped at once and values
+		seen afterwards start from floor, the highest count dropped so far
+		Counts are never below the real count and at most floor above it, distinct values are
+		counted by a HyperLogLog from then on
+	"""
+
+	__slots__ = ('counts', 'limit', 'floor', 'sketch', 'precision')
+
+	def __init__(self, limit=AGGREGATE_LIMIT, precision=HLL_PRECISION):
+		#Initialize Variables
+		self.counts 	= {}
+		self.limit 		= max(limit, 2)
+		self.floor 		= 0
+		self.sketch 	= None
+		self.precision 	= precision
+
+	def __len__(self):
+		return len(self.counts)
+
+	@property
+	def exact(self):
+		return self.sketch is None
+
+	def add(self, value):
+		if value in self.counts:
+			self.counts[value] += 1
+		else:
+			self.insert(value)
+
+	def insert(self, value):
+		"""
+			Start counting a value that isn't in counts
+		"""
+		counts = self.counts
+		counts[value] = self.floor + 1
+		#Values already counted are in the sketch, only new ones need hashing
+		if self.sketch is not None:
+			self.sketch.add(value)
+		if len(counts) > self.limit:
+			self.prune()
+
+	def distinctSketch(self):
+		"""
+			Returns the HyperLogLog of every value seen, built from the counts while still exact
+		"""
+		if self.sketch is not None:
+			return self.sketch
+		sketch = HyperLogLog(self.precision)
+		for value in self.counts:
+			sketch.add(value)
+		return sketch
+
+	def prune(self):
+		"""
+			Keep the limit // 2 most frequent values, counts stays the same dict
+		"""
+		self.sketch = self.distinctSketch()
+		keep 		= self.limit // 2
+		ranked 		= sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+		self.floor 	= max(self.floor, ranked[keep][1])
+		self.counts.clear()
+		self.counts.update(ranked[:keep])
+
+	def merge(self, other):
+		"""
+			Add the counts of other, values missing on one side are counted at that side's floor
+		"""
+		counts 		= self.counts
+		otherCounts = other.counts
+		if self.sketch is not None or other.sketch is not None:
+			sketch = self.distinctSketch()
+			sketch.merge(other.distinctSketch())
+			self.sketch = sketch
+		if other.floor:
+			for value in counts:
+				if value not in otherCounts:
+					counts[value] += other.floor
+		for (value, count) in otherCounts.items():
+			counts[value] = counts.get(value, self.floor) + count
+		self.floor += other.floor
+		if len(counts) > self.limit:
+			self.prune()
+
+	def distinct(self):
+		"""
+			Returns the number of distinct values, estimated once past limit
+		"""
+		return len(self.counts) if self.sketch is None else self.sketch.count()
+
+	def top(self, count=AGGREGATE_TOP):
+		"""
+			Returns list of the count most frequent (value, count) pairs
+		"""
+		return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:count]
+
+
+class UrlAggregate:
+	"""
+		UrlAggregate Class
+
+		Summary of parsed urls in bounded memory, one FieldCounter per field
+		Aggregates of the same fields merge, so parallel workers can each build their own
+		report() returns the summary as a dict, see UrlDeconstruction.aggregate
+	"""
+
+	def __init__(self, fields=AGGREGATE_FIELDS, limit=AGGREGATE_LIMIT, precision=HLL_PRECISION):
+		unknown = [name for name in fields if name not in COLUMNS and name not in ('domain', 'cgi_key')]
+		if unknown:
+			raise ValueError('unknown fields %s, fields are domain, cgi_key and %s' % (', '.join(unknown), ', '.join(COLUMNS)))
+		#Initialize Variables
+		self.fields 	= tuple(fields)
+		self.urls 		= 0
+		self.failed 	= 0
+		self.counters 	= {name: FieldCounter(limit, precision) for name in self.fields}
+		self._plan 		= tuple((COLUMNS.index(name), self.counters[name].counts, self.counters[name].insert)
+								for name in self.fields if name in COLUMNS)
+		self._domain 	= self.counters.get('domain')
+		self._cgiKey 	= self.counters.get('cgi_key')
+
+	def add(self, parsed):
+		"""
+			Count one ParsedUrl, urls with a warning count as failed, their components are counted too
+		"""
+		row = parsed.row()
+		self.urls += 1
+		if row[ROW_WARNING] is not None:
+			self.failed += 1
+		#Inlined FieldCounter.add, counts are the FieldCounter dicts
+		for (index, counts, insert) in self._plan:
+			value = row[index]
+			if value in counts:
+				counts[value] += 1
+			elif value is not None:
+				insert(value)
+		if self._domain is not None and row[ROW_TLD] is not None:
+			self._domain.add(row[ROW_SLD] + '.' + row[ROW_TLD] if row[ROW_SLD] else row[ROW_TLD])
+		if self._cgiKey is not None and row[ROW_QUERY]:
+			#Urls with a key more than once count once
+			for key in set(parsed._urld.parseQuery(row[ROW_QUERY])._keys):
+				self._cgiKey.add(key)
+
+	def update(self, parsedUrls):
+		for parsed in parsedUrls:
+			self.add(parsed)
+		return self
+
+	def merge(self, other):
+		"""
+			Add the counts of another UrlAggregate with the same fields
+		"""
+		if other.fields != self.fields:
+			raise ValueError('can\'t merge aggregates of different fields')
+		self.urls 	+= other.urls
+		self.failed += other.failed
+		for name in self.fields:
+			self.counters[name].merge(other.counters[name])
+		return self
+
+	def report(self, top=AGGREGATE_TOP):
+		"""
+			Returns dict of the url counts and, per field, the distinct values, whether the counts are exact,
+			how far above the real count they may be (max_error) and the top most frequent values
+		"""
+		fields = {}
+		for name in self.fields:
+			counter 		= self.counters[name]
+			fields[name] 	= {'distinct': counter.distinct(), 'exact': counter.exact, 'max_error': counter.floor,
+							   'top': [list(item) for item in counter.top(top)]}
+		return {'urls': self.urls, 'failed': self.failed, 'fields': fields}
+
+
+class KeySet:
+	"""
+		KeySet Class
+
+		Exact dedup filter, remembers every key, see UrlDeconstruction.parse_unique
+	"""
+
+	def __init__(self):
+		#Initialize Variables
+		self.keys = set()
+
+	def __len__(self):
+		return len(self.keys)
+
+	def __contains__(self, key):
+		return key in self.keys
+
+	def add(self, key):
+		"""
+			Returns True when key wasn't seen before
+		"""
+		if key in self.keys:
+			return False
+		self.keys.add(key)
+		return True
+
+
+class BloomFilter:
+	"""
+		BloomFilter Class
+
+		Dedup filter in fixed memory, sized for capacity keys at errorRate false positives,
+		a new key is taken for a duplicate that often, a duplicate is never taken for a new key
+		Keys are digests, like ParsedUrl.canonicalKey, their first 16 bytes give the bit positions
+	"""
+
+	def __init__(self, capacity=DEDUP_CAPACITY, errorRate=DEDUP_ERROR_RATE):
+		if capacity < 1 or not 0 < errorRate < 1:
+			raise ValueError('capacity must be positive and errorRate between 0 and 1')
+		#Initialize Variables, bits and hash count for the target rate
+		self.size 	= max(2, int(math.ceil(-capacity * math.log(errorRate) / math.log(2) ** 2)))
+		self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+		self.bits 	= bytearray((self.size + 7) // 8)
+		self.count 	= 0
+
+	def __len__(self):
+		#Keys added that weren't in the filter yet
+		return self.count
+
+	def positions(self, key):
+		"""
+			Returns the bit positions of key, double hashing: first, first + step, first + 2 * step ...
+			step is 1 to size - 1, never 0 mod size, so the positions never all fall on one bit
+		"""
+		if len(key) < 16:
+			key = hashlib.blake2b(key, digest_size=16).digest()
+		size 	= self.size
+		first 	= int.from_bytes(key[:8], 'little') % size
+		step 	= 1 + int.from_bytes(key[8:16], 'little') % (size - 1)
+		return [(first + i * step) % size for i in range(self.hashes)]
+
+	def __contains__(self, key):
+		bits = self.bits
+		return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+	def add(self, key):
+		"""
+			Returns True when key wasn't seen before, up to the false positive rate
+		"""
+		if len(key) < 16:
+			key = hashlib.blake2b(key, digest_size=16).digest()
+		#positions() inlined
+		(bits, size) 	= (self.bits, self.size)
+		position 		= int.from_bytes(key[:8], 'little') % size
+		step 			= 1 + int.from_bytes(key[8:16], 'little') % (size - 1)
+		new 			= False
+		for i in range(self.hashes):
+			byte = bits[position >> 3]
+			mask = 1 << (position & 7)
+			if not byte & mask:
+				bits[position >> 3] = byte | mask
+				new = True
+			position = (position + step) % size
+		if new:
+			self.count += 1
+		return new
+
+
 class UrlDeconstruction:
 	"""
-		UrlDeconstruction Class
-			
-		Requirements:
-			Python3
-			urllib3==1.7.1
-			netaddr==0.7.15
+		UrlDeconstruction Class
+			
+		Requirements:
+			Python3
+
+		Notes:
+			Update updateStates function to order the dict by keys
+			Patterns come from the module level PATTERNS registry unless a
+			PatternRegistry is passed in
+			cacheSize > 0 keeps that many results in an LRU cache keyed on the raw
+			input url, callers always get copies of the cached results
+			hostCacheSize > 0 keeps that many ipv4 / ipv6 / domain results keyed on
+			the host part alone, so ip conversions and regex work are skipped for known hosts
+			bytes, bytearray and memoryview urls are parsed without decoding them, see parseBytes
+			Errors are recorded on the results as ParseIssue records (stage, reason, offset) and
+			listed under 'errors', strict=True raises them as NoHostError / CredentialError /
+			AddressError instead, tracebacks=True prints what the parse* stage functions catch
+			psl, a PublicSuffixList or the path of one, splits domains on their public suffix,
+			tld 'co.uk' and sld 'domain' for domain.co.uk, without it tld is the last label
+			queryEngine='split' fills cgi from parseQuery instead of the parseCGI regex,
+			every value of a repeated key is kept with multiValue=True, decoded with decodeQuery=True
+			blocklist, a Blocklist or the path(s) of lists / snapshots, adds the rule matching the host
+			of a url under 'blocklist' ({'rule': ..., 'list': ...})
+			serializer, a Serializer or one of SERIALIZERS, is the format serialize() and returnJson() use
+	"""
+
+	def __init__(self, patterns=None, cacheSize=0, hostCacheSize=0, strict=False, tracebacks=False, psl=None,
+				 queryEngine='regex', multiValue=False, decodeQuery=False, blocklist=None, serializer='pretty'):
+		#Initialize Variables
+		self._urlComponents 	= {}
+		self._urlString 		= ''
+		self._patterns 			= patterns if patterns is not None else PATTERNS
+		self._cache 			= LruCache(cacheSize) if cacheSize > 0 else None
+		self._hostCache 		= LruCache(hostCacheSize) if hostCacheSize > 0 else None
+		self._hostCacheVersion 	= self._patterns.version
+		self._cacheVersion 		= self._patterns.version
+		self._bytesUrld 		= None
+		self._instrumentation 	= None
+		self._unquote 			= urllib.parse.unquote
+		self._unquoteBytes 		= urllib.parse.unquote_to_bytes
+		self._parseStages 		= PARSE_STAGES
+		self._namedStages 		= NAMED_STAGES
+		self._builtin 			= False
+		self._builtinVersion 	= -1
+		self._strict 			= strict
+		self._tracebacks 		= tracebacks
+		self._psl 				= loadSuffixList(psl)
+		self._queryEngine 		= queryEngine
+		self._multiValue 		= multiValue
+		self._decodeQuery 		= decodeQuery
+		self._blocklist 		= loadBlocklist(blocklist)
+		self._serializer 		= serializer if isinstance(serializer, Serializer) else Serializer(serializer)
+		if queryEngine not in ('regex', 'split'):
+			raise ValueError("queryEngine must be 'regex' or 'split', not %r" % (queryEngine,))
+		if (multiValue or decodeQuery) and queryEngine != 'split':
+			raise ValueError("multiValue and decodeQuery need queryEngine='split'")
+
+	def stageError(self, stage):
+		"""
+			Called by the parse* stage functions with the exception they caught being handled
+			It is dropped, unless the instance was asked for tracebacks
+		"""
+		if self._tracebacks:
+			sys.stderr.write('urlParser: %s stage failed\n' % (stage,))
+			traceback.print_exc()
+
+	def findPattern(self, patternList, testString):
+		"""
+			Takes a dict of patterns, finds match against testString
+			First one to match wins
+			
+			Returns dict key or None if unable to find match
+		"""
+		return self.matchPattern(patternList, testString)[0] or False
+
+	def matchPattern(self, patternList, testString, pos=0, end=None):
+		"""
+			Same as findPattern but also hands back the match object,
+			so the winning pattern doesn't have to be run a second time
+			pos / end limit the match to testString[pos:end] without slicing it
+
+			Returns tuple (key, match) or (None, None)
+		"""
+		try:
+			if end is None: end = len(testString)
+			for regExpKey, regExpPattern in patternList.items():
+				pattern = regExpPattern.match(testString, pos, end)
+				if pattern:
+					return (regExpKey, pattern)
+		except Exception:
+			self.stageError('pattern')
+		return (None, None)
+
+	def updateStates(self, data):
+		"""
+			Update the current urlString State as well as the urlComponents Dict
+			#Takes tupil (urlComponents, urlString)
+		"""
+		try:
+			(components, urlString) = data
+			self._urlString 		= urlString
+			self._urlComponents.update(components)
+		except Exception:
+			self.stageError('state')
+
+	def returnJson(self):
+		"""
+			Returns urlComponents out as JSON friendly string, in the serializer's layout for the JSON
+			serializers, pretty for MessagePack
+		"""
+		if self._serializer.binary:
+			return json.dumps(self._urlComponents, sort_keys=True, indent=4, separators=(',', ': '))
+		return self._serializer.dumps(self._urlComponents)
+
+	def serialize(self, urlComponents=None):
+		"""
+			Returns urlComponents, the last urlParseEngine results by default, as bytes in the serializer's format
+		"""
+		return self._serializer.encode(self._urlComponents if urlComponents is None else urlComponents)
+
+	def hostDetails(self, details, group, regExpKey, address, port, converted=None):
+		"""
+			Fill the ipv4 / ipv6 / domain details dict for a matched host
+			Keys are added in order, on a conversion error details holds what was set so far
+			converted is the notation / standard form when it was already worked out
+		"""
+		if group == 'domain':
+			fqdn 		= address
+			lastDot 	= fqdn.rfind('.')
+			if port: 			details['port']	= port
+			if fqdn: 			details['fqdn']	= fqdn
+			if lastDot != -1:
+				(host, sld, tld) = self.splitDomain(fqdn)
+				details['tld'] = tld
+				if sld is not None: 	details['sld'] 	= sld
+				if host is not None: 	details['host'] = host
+
+		elif group == 'ipv6':
+			if port:				details['port'] = port
+			if regExpKey != 'Std':	details['standard'] = converted or ipv6Standard(int(address))
+			details['address'] 		= address.lower()
+			details['type'] 		= regExpKey.lower()
+
+		else:
+			if port:					details['port'] = port
+			if regExpKey != 'DotNot':	details['notation'] = converted or ipv4Notation(address)
+			details['address'] 			= address
+			details['type'] 			= regExpKey.lower()
+
+		return details
+
+	def splitDomain(self, fqdn):
+		"""
+			Split fqdn into tuple (host, sld, tld), None for the parts it doesn't have
+			tld is the last label, or the public suffix when the instance has a psl
+		"""
+		lastDot = fqdn.rfind('.')
+		if lastDot == -1:
+			return (None, None, None)
+		#Public suffix, the dot before it stands in for the last one
+		if self._psl is not None:
+			lastDot = self._psl.suffixStart(fqdn) - 1
+			if lastDot == -1:
+				return (None, None, fqdn)
+
+		#Extract SLD Information, only the last two '.' positions matter
+		prevDot = fqdn.rfind('.', 0, lastDot)
+		if prevDot == -1:	# Domain contains only SLD
+			return (None, fqdn[:lastDot], fqdn[lastDot+1:])
+		return (fqdn[:prevDot], fqdn[prevDot+1:lastDot], fqdn[lastDot+1:])
+
+	def parseHostGroup(self, group, urlString):
+		"""
+			Attempt to get a host of a single group (ipv4, ipv6 or domain) w/ Port from the url string input
+		"""
+		try:
+			#Create Dict & vars for results
+			results 		= None
+			newUrlString	= ''
+
+			#Find Pattern to use
+			(regExpKey, match) = self.matchPattern(self._patterns.group(group), urlString)
+
+			#Parse urlString, HOST_TAIL puts the port in the second to last group
+			if regExpKey:
+				results 	= {group: {}}
+				self.hostDetails(results[group], group, regExpKey, match.group(1), match.group(match.re.groups - 1))
+				newUrlString = urlString[match.end():]
+
+		except Exception:
+			self.stageError('host')
+
+		finally:
+			#Return results
+			return (results, newUrlString)
+
+	def parseIpv4(self, urlString):
+		"""
+			Attempt to get IPv4 w/ Port from the url string input
+		"""
+		return self.parseHostGroup('ipv4', urlString)
+
+	def parseIpv6(self, urlString):
+		"""
+			Attempt to get IPv6 w/ Port from the url string input
+		"""
+		return self.parseHostGroup('ipv6', urlString)
+
+	def parseDomain(self, urlString):
+		"""
+			Attempt to get Domain details from url string
+		"""
+		return self.parseHostGroup('domain', urlString)
+
+	def matchHost(self, urlString, pos=0, end=None):
+		"""
+			Find the host at pos of url string, trying ipv6, ipv4 then domain patterns
+			end stands in for the end of the url string, match offsets are into the whole string
+
+			Returns tuple (group, regExpKey, match, addressGroup, portGroup) or None
+		"""
+		if end is None: end = len(urlString)
+		#Registry holds host patterns that can't be combined, try each group in turn
+		classifier = self._patterns.hostClassifier()
+		if classifier is None:
+			for group in HOST_GROUPS:
+				(regExpKey, match) = self.matchPattern(self._patterns.group(group), urlString, pos, end)
+				if regExpKey:
+					return (group, regExpKey, match, 1, match.re.groups - 1)
+			return None
+
+		#One match decides the host type, the first alternative that took part wins
+		(regHost, alternatives, portGroup) = classifier
+		match = regHost.match(urlString, pos, end)
+		if match:
+			for (group, regExpKey, addressGroup) in alternatives:
+				if match.start(addressGroup) != -1:
+					return (group, regExpKey, match, addressGroup, portGroup)
+		return None
+
+	def hostKey(self, urlString, pos=0, end=None):
+		"""
+			Returns the part of url string from pos that decides the host match, or None when it is too long to cache
+			Host patterns stop at the first '/', after the closing ']' for bracketed IPv6
+		"""
+		if end is None: end = len(urlString)
+		(opening, closing, slash) = (b'[', b']', b'/') if type(urlString) is bytes else ('[', ']', '/')
+		keyStart = max(urlString.find(closing, pos, end) + 1, pos) if urlString.startswith(opening, pos, end) else pos
+		slashPos = urlString.find(slash, keyStart, end)
+		keyEnd 	 = slashPos + 1 if slashPos != -1 else end
+		return urlString[pos:keyEnd] if keyEnd - pos <= HOST_KEY_LIMIT else None
+
+	def locateHost(self, urlString, pos=0, end=None):
+		"""
+			Find the host at pos of url string, like matchHost, going through the host cache when one is configured
+			converted is the ipv4 notation / ipv6 standard form, None when the address needs none
+			and False when it can't be converted
+
+			Returns tuple (group, regExpKey, hostStart, hostEnd, portStart, portEnd, tailEnd, converted) or None
+			Offsets are into url string, portStart / portEnd are -1 without a port
+		"""
+		if end is None: end = len(urlString)
+
+		#Cached entries hold the offsets relative to pos, or None when there was no host
+		hostCache 	= self._hostCache
+		hostKey 	= None
+		if hostCache is not None:
+			if self._hostCacheVersion != self._patterns.version:
+				hostCache.clear(counters=False)
+				self._hostCacheVersion = self._patterns.version
+			hostKey = self.hostKey(urlString, pos, end)
+			if hostKey is not None:
+				cached = hostCache.get(hostKey, False)
+				if cached is not False:
+					if cached is None:
+						return None
+					(group, regExpKey, hostStart, hostEnd, portStart, portEnd, tailEnd, converted) = cached
+					return (group, regExpKey, pos + hostStart, pos + hostEnd, pos + portStart if portStart != -1 else -1,
+							pos + portEnd if portEnd != -1 else -1, pos + tailEnd, converted)
+
+		hostMatch = self.matchHost(urlString, pos, end)
+		if hostMatch is None:
+			if hostKey is not None: hostCache.put(hostKey, None)
+			return None
+
+		#Notation / standard form
+		(group, regExpKey, match, addressGroup, portGroup) = hostMatch
+		converted = None
+		address 	= match.group(addressGroup)
+		try:
+			if group == 'ipv4' and regExpKey != 'DotNot':	converted = ipv4Notation(address if type(address) is str else address.decode('ascii'))
+			elif group == 'ipv6' and regExpKey != 'Std': 	converted = ipv6Standard(int(address))
+		except ValueError:
+			converted = False
+
+		(hostStart, hostEnd) = match.span(addressGroup)
+		(portStart, portEnd) = match.span(portGroup)
+		if hostKey is not None:
+			hostCache.put(hostKey, (group, regExpKey, hostStart - pos, hostEnd - pos, portStart - pos if portStart != -1 else -1,
+									portEnd - pos if portEnd != -1 else -1, match.end() - pos, converted))
+		return (group, regExpKey, hostStart, hostEnd, portStart, portEnd, match.end(), converted)
+
+	def parseHost(self, urlString):
+		"""
+			Attempt to get IPv6, IPv4 or Domain details from url string in a single pass
+			Same precedence as trying parseIpv6, parseIpv4 then parseDomain
+			Goes through the host cache when one is configured
+		"""
+		try:
+			#Create Dict & vars for results
+			results 		= None
+			newUrlString	= ''
+
+			hostSpan = self.locateHost(urlString)
+			if hostSpan is not None:
+				(group, regExpKey, hostStart, hostEnd, portStart, portEnd, tailEnd, converted) = hostSpan
+				port 		= urlString[portStart:portEnd] if portStart != -1 else None
+				results 	= {group: {}}
+				#Conversion error, only the port was set before it
+				if converted is False:
+					if port: results[group]['port'] = port
+					raise ValueError("Unable to convert %s address '%s'" % (group, urlString[hostStart:hostEnd]))
+				self.hostDetails(results[group], group, regExpKey, urlString[hostStart:hostEnd], port, converted)
+				newUrlString = urlString[tailEnd:]
+
+		except Exception:
+			self.stageError('host')
+
+		finally:
+			#Return results
+			return (results, newUrlString)
+
+	def parseScheme(self, urlString):
+		"""
+			Attempt to get Application Scheme from url string
+		"""
+		try:
+			#Scheme Regex
+			regScheme	=	self._patterns.get('scheme', 'Scheme')
+
+			#Create Dict & vars for results
+			results 			= {}
+			results['scheme'] 	= {}
+			newUrlString		= ''
+
+			#Parse urlString
+			out = regScheme.match(urlString)
+			if out:
+				results['scheme'] 	= urlString[:out.end()]
+				newUrlString 		= urlString[out.end():]
+
+			else:
+				results = None
+
+		except Exception:
+			self.stageError('scheme')
+
+		finally:
+			#Return results
+			return (results, newUrlString)	
+
+	def scanCredential(self, urlString, pos=0, end=None):
+		"""
+			Search url string from pos for the credentials, end stands in for the end of the string
+
+			Returns the offset of the '@' closing the credentials, or -1 when there are none
+		"""
+		if end is None: end = len(urlString)
+		#The built-in pattern needs an '@', finding none is much cheaper than the search
+		if urlString.find(b'@' if type(urlString) is bytes else '@', pos, end) == -1 and self.builtinPatterns():
+			return -1
+		pattern = self._patterns.get('credential', 'Creds')
+		match 	= (pattern.match if self._patterns.anchored('credential', 'Creds') else pattern.search)(urlString, pos, end)
+		return match.end() - 1 if match else -1
+
+	def builtinPatterns(self):
+		"""
+			True when the scheme and credential patterns are the built-in ones (or their bytes form)
+		"""
+		registry = self._patterns
+		if self._builtinVersion != registry.version:
+			patterns 				= (registry.get('scheme', 'Scheme').pattern, registry.get('credential', 'Creds').pattern)
+			self._builtin 			= patterns in ((SCHEME_PATTERN, CREDENTIAL_PATTERN), (SCHEME_PATTERN.encode('ascii'), CREDENTIAL_PATTERN.encode('ascii')))
+			self._builtinVersion 	= registry.version
+		return self._builtin
+
+	def prefilter(self, urlInputs):
+		"""
+			Classify a block of urls in one pass, one flag per url, True for the urls the named host
+			fast path takes: http(s) urls whose host starts with a letter, with nothing to unquote
+			and no credentials. Those skip unquoting, the scheme pattern and the credential search,
+			ip hosts and everything else go through every stage
+
+			Returns list of bools
+		"""
+		if not self.builtinPatterns():
+			return [False] * len(urlInputs)
+		(match, matchBytes) = (NAMED_URL.match, NAMED_URL_BYTES.match)
+		return [(match(urlInput) if type(urlInput) is str else matchBytes(urlInput) if type(urlInput) is bytes else None) is not None
+				for urlInput in urlInputs]
+
+	def parseCredentials(self, urlString):
+		"""
+			Attempt to get Credentials from url string
+		"""
+		try:
+			#Create Dict & vars for results
+			results 				= {}
+			results['credential'] 	= {}
+			newUrlString 			= ''
+
+			#Parse urlString
+			credEnd = self.scanCredential(urlString)
+			if credEnd != -1:
+				credString	= urlString[:credEnd]
+				#Seperate User:Pass if present
+				if credString.find(':') > 0:
+					(credUser, credPass) 				= credString.split(':')
+					results['credential']['username'] 	= credUser
+					results['credential']['password'] 	= credPass
+				else:
+					results['credential']['username'] 	= credString
+
+				newUrlString = urlString[credEnd+1:]
+				
+			else:
+				results =  None
+
+		except Exception:
+			self.stageError('credential')
+
+		finally:
+			#Return results
+			return (results, newUrlString)
+
+	def parseAnchor(self, urlString):
+		"""
+			Attempt to get Anchor from url string
+		"""	
+		try:
+			#Create Dict & vars for results
+			results 			= {}
+			newUrlString 		= ''
+
+			#If urlString Contains an Anchor, extract that now
+			if urlString.find("#") >= 0:
+				anchorPos 			= urlString.find('#')
+				results['#'] 		= urlString[anchorPos+1:]
+				newUrlString		= urlString[:anchorPos]
+
+			else:
+				results = None
+
+		except Exception:
+			self.stageError('anchor')
+
+		finally:
+			#Return results
+			return (results, newUrlString)
+
+	def parsePath(self, urlString):
+		"""
+			Attempt to get Path Information from url string
+		"""
+		try:
+			#Path Regex
+			regPath		=	self._patterns.get('path', 'Path')
+
+			#Create Dict & vars for results
+			results 			= {}
+			results['path'] 	= {}
+			newUrlString 		= ''
+
+			#Parse urlString
+			out = regPath.match(urlString)
+			if out:
+				#If the path is empty, return None with empty url string
+				if out.groups()[0] != '':
+					results['path'] = out.groups()[0]
+					newUrlString 	= urlString[out.end()+1:]
+				else:
+					results = None
+			else:
+				results = None
+
+		except Exception:
+			self.stageError('path')
+
+		finally:
+			#Return results
+			return (results, newUrlString)
+
+	def parseCGI(self, urlString):
+		"""
+			Attempt to get CGI values and Anchor from url string
+		"""
+		try:
+			#CGI Regex
+			regCGI		=	self._patterns.get('cgi', 'CGI')
+
+			#Create Dict and vars for results
+			results				= {}
+			results['cgi']		= {}
+			foundAnchor			= False
+
+			#Parse urlString
+			out = regCGI.findall(urlString)
+			if out != [('', '', '', '')]:
+				for values in out:
+					#Shorten Value Names
+					v0 = values[0]
+					v1 = values[1]
+					v2 = values[2]
+					v3 = values[3]
+					if v0:	results['cgi'][v0] = v1
+					if v2:	results['cgi'][v2] = ''
+					if v3:	results['cgi'][v3] = ''
+
+			else:
+				if not foundAnchor:	results =  None
+
+		except Exception:
+			self.stageError('cgi')
+
+		finally:
+			#Return results
+			return (results, '')
+
+	def parseQuery(self, queryString, decode=None, maxParams=QUERY_MAX_PARAMS, maxLength=QUERY_MAX_LENGTH):
+		"""
+			Split a query string into QueryParams, pairs are separated by '&' or ';',
+			the first '=' splits key from value, a pair without one has value '', a leading '?' is skipped
+			Only the first maxLength characters and maxParams pairs are kept, QueryParams.truncated tells
+			decode, the instance's decodeQuery by default, percent / '+' decodes keys now and values when read
+		"""
+		if decode is None: decode = self._decodeQuery
+		#Urls without a path keep the '?' in front of the query
+		if queryString[:1] == '?':
+			queryString = queryString[1:]
+		truncated = len(queryString) > maxLength
+		if truncated:
+			queryString = queryString[:maxLength]
+		if ';' in queryString:
+			queryString = queryString.replace(';', '&')
+
+		keys 	= []
+		values 	= []
+		for pair in queryString.split('&'):
+			if not pair:
+				continue
+			if len(keys) == maxParams:
+				truncated = True
+				break
+			(key, sep, value) = pair.partition('=')
+			if decode and ('%' in key or '+' in key):
+				key = urllib.parse.unquote_plus(key)
+			keys.append(key)
+			values.append(value)
+		return QueryParams(keys, values, decode, truncated)
+
+	def cacheStats(self):
+		"""
+			Returns the result cache counters, see LruCache.stats, or None when caching is off
+		"""
+		return self._cache.stats() if self._cache is not None else None
+
+	def hostCacheStats(self):
+		"""
+			Returns the host cache counters, see LruCache.stats, or None when host caching is off
+		"""
+		return self._hostCache.stats() if self._hostCache is not None else None
+
+	def deconstruct(self, urlInput, urlComponents):
+		"""
+			Systematicly Deconstruct the url string left -> right, filling urlComponents
+			Keeps no state on the instance, so one instance can be shared between threads
+			Goes through the result cache when one is configured
+
+			Returns the unparsed remainder of the url string
+			Raises NoHostError when no host information is found, strict instances
+			raise the UrlParseError of the first error recorded
+		"""
+		#bytes urls are cached under their bytes, bytearray / memoryview can't be keys
+		if self._cache is None or type(urlInput) is not str and type(urlInput) is not bytes:
+			return self.deconstructUrl(urlInput, urlComponents)
+
+		#Registry changed since the entries were stored
+		if self._cacheVersion != self._patterns.version:
+			self._cache.clear(counters=False)
+			self._cacheVersion = self._patterns.version
+
+		#Cached entries are (urlComponents, urlString, UrlParseError or None)
+		cached = self._cache.get(urlInput)
+		if cached is not None:
+			urlComponents.update(copyComponents(cached[0]))
+			if cached[2] is not None:
+				err = cached[2]
+				raise err.__class__(str(err), urlComponents, err.stage, err.offset)
+			return cached[1]
+
+		try:
+			urlString = self.deconstructUrl(urlInput, urlComponents)
+		except UrlParseError as err:
+			self._cache.put(urlInput, (copyComponents(urlComponents), '', err))
+			raise
+		self._cache.put(urlInput, (copyComponents(urlComponents), urlString, None))
+		return urlString
+
+	def deconstructUrl(self, urlInput, urlComponents):
+		"""
+			Uncached deconstruct, walks the url with a cursor through parseUrl
+			Same results as deconstructSliced without copying what is left of the url at every step
+		"""
+		try:
+			parsed = self.parseUrl(urlInput)
+		except UrlParseError as err:
+			#Strict, hand back what was parsed in urlComponents as well
+			urlComponents.update(err.components)
+			err.components = urlComponents
+			raise
+		urlComponents.update(parsed.to_dict())
+		if parsed.warning is not None:
+			raise parsed.error(parsed.errors[-1])
+		return '' if 'cgi' in urlComponents else parsed.query
+
+	def deconstructSliced(self, urlInput, urlComponents):
+		"""
+			Uncached deconstruct built from the parse* stage functions, each one
+			handing the rest of the url string to the next, see comments
+		"""
+		#1. 	Clean the URL, as it may be qouted
+		cleanUrl 	= self._unquote(urlInput)
+
+		#2. 	Recored the results
+		urlComponents['input_url'] 	= urlInput
+		#2a. 	Make note if it was diffrent, set urlInput to new cleaned input
+		if cleanUrl != urlInput:
+			urlComponents['clean_url'] = cleanUrl
+
+		#3. 	Set the urlString variable
+		urlString = cleanUrl
+
+		#4. 	Begin main parse logic
+		# 		--Scheme
+		(results, newUrlString) = self.parseScheme(urlString)
+		if results is not None:
+			urlComponents.update(results)
+			urlString = newUrlString
+
+		#		--Credentials
+		(results, newUrlString) = self.parseCredentials(urlString)
+		if results is not None:
+			urlComponents.update(results)
+			urlString = newUrlString
+
+		#5. 	IPv6/IPv4 and Domain Parsing, single pass, First match wins
+		(results, newUrlString) = self.parseHost(urlString)
+
+		#6. 	Filter Step, if no host information was found, we should stop
+		if results is None:
+			urlComponents['warning_message'] = NO_HOST
+			raise NoHostError("Unable to determine host, stopping parser", urlComponents, 'host')
+		urlComponents.update(results)
+		urlString = newUrlString
+
+		#New. 	Anchor Parsing - We are going to remove the Anchor if it exist vs working our way to it.
+		(results, newUrlString) = self.parseAnchor(urlString)
+		if results is not None:
+			urlComponents.update(results)
+			urlString = newUrlString
+
+		#7. 	Path Parsing
+		(results, newUrlString) = self.parsePath(urlString)
+		if results is not None:
+			urlComponents.update(results)
+			urlString = newUrlString
+
+		#8. 	CGI/Anchor Parsing
+		(results, newUrlString) = self.parseCGI(urlString)
+		if results is not None:
+			urlComponents.update(results)
+			urlString = newUrlString
+
+		return urlString
+
+	def parseUrl(self, urlInput, lazy=False, named=None):
+		"""
+			Deconstruct a url into a compact ParsedUrl, see deconstructSliced for the steps
+			Offsets are recorded as the url is walked, substrings are only made when read
+			lazy=True walks nothing up front, each property only runs the stages it needs
+			named is the prefilter flag of the url, worked out here when not given
+
+			Returns ParsedUrl, check .warning for urls without a host
+		"""
+		if type(urlInput) is not str and isinstance(urlInput, (bytes, bytearray, memoryview)):
+			return self.parseBytes(urlInput, lazy, named)
+
+		#Named host fast path, see prefilter
+		if named is None:
+			named = type(urlInput) is str and NAMED_URL.match(urlInput) is not None and self.builtinPatterns()
+		if named:
+			parsed = ParsedUrl(self, urlInput, urlInput, self._namedStages)
+		else:
+			#Clean the URL, as it may be qouted
+			cleanUrl 	= self._unquote(urlInput)
+			parsed 		= ParsedUrl(self, urlInput, cleanUrl if cleanUrl != urlInput else urlInput)
+		if not lazy:
+			parsed.advance()
+		return parsed
+
+	def parseBytes(self, urlInput, lazy=False, named=None):
+		"""
+			Deconstruct a bytes, bytearray or memoryview url into a ParsedBytes without decoding it
+			Runs the bytes form of the patterns, components are decoded only when read and
+			come out the same as parseUrl gives for the utf-8 decoded url
+			Urls holding non ASCII bytes, before or after unquoting, are decoded and go through parseUrl
+			bytearray / memoryview input is copied to bytes once, as lazy results read it later
+
+			Returns ParsedUrl, check .warning for urls without a host
+		"""
+		source 		= urlInput if type(urlInput) is bytes else bytes(urlInput)
+		bytesUrld 	= self.bytesParser()
+		if bytesUrld is None or not source.isascii():
+			return self.parseUrl(source.decode('utf-8', 'replace'), lazy)
+
+		#Named host fast path, see prefilter
+		if named is None:
+			named = NAMED_URL_BYTES.match(source) is not None and self.builtinPatterns()
+
+		#Clean the URL, as it may be qouted
+		cleanUrl = source
+		if not named and b'%' in source:
+			cleanUrl = self._unquoteBytes(source)
+			if not cleanUrl.isascii():
+				return self.parseUrl(source.decode('ascii'), lazy)
+			if cleanUrl == source:
+				cleanUrl = source
+
+		parsed = ParsedBytes(bytesUrld, source, cleanUrl, bytesUrld._namedStages if named else None)
+		if not lazy:
+			parsed.advance()
+		return parsed
+
+	def bytesParser(self):
+		"""
+			Returns the UrlDeconstruction parseBytes walks with, on the bytes form of the registry
+			or None when the registry has patterns that can't run on bytes
+			It shares this instance's host cache, bytes host keys never equal str ones
+		"""
+		registry = self._patterns.bytesRegistry()
+		if registry is None:
+			return None
+		if self._bytesUrld is None or self._bytesUrld._patterns is not registry:
+			#Entries of the bytes registry the last one was built from are stale
+			if self._bytesUrld is not None and self._hostCache is not None:
+				self._hostCache.clear(counters=False)
+			self._bytesUrld = UrlDeconstruction(registry, strict=self._strict, tracebacks=self._tracebacks, psl=self._psl,
+												queryEngine=self._queryEngine, multiValue=self._multiValue, decodeQuery=self._decodeQuery,
+												blocklist=self._blocklist)
+			self._bytesUrld._hostCache = self._hostCache
+			if self._instrumentation is not None:
+				self._bytesUrld.instrument(self._instrumentation)
+		return self._bytesUrld
+
+	def instrument(self, instrumentation=None):
+		"""
+			Start collecting per stage timings and host pattern counts, see Instrumentation
+			Timed wrappers are set on this instance over the stage functions, uninstrument()
+			takes them off again, so an instance that was never instrumented pays nothing
+			instrumentation may be shared between instances to collect their figures together
+
+			Returns the Instrumentation
+		"""
+		self.uninstrument()
+		instrumentation 	= instrumentation if instrumentation is not None else Instrumentation()
+		timed 				= instrumentation.timed
+		self._unquote 		= timed('unquote', urllib.parse.unquote)
+		self._unquoteBytes 	= timed('unquote', urllib.parse.unquote_to_bytes)
+		self._parseStages 	= (None,) + tuple(timed(name, function) for (name, function) in zip(STAGE_NAMES, PARSE_STAGES[1:]))
+		self._namedStages 	= (None,) + tuple(timed(name, function) for (name, function) in zip(STAGE_NAMES, NAMED_STAGES[1:]))
+		for (name, method) in INSTRUMENTED_METHODS:
+			setattr(self, method, timed(name, getattr(self, method)))
+		self.locateHost 		= instrumentation.counted(self.locateHost)
+		self._instrumentation 	= instrumentation
+		self._bytesUrld 		= None
+		return instrumentation
+
+	def uninstrument(self):
+		"""
+			Stop collecting, the figures stay in the Instrumentation
+		"""
+		for (name, method) in INSTRUMENTED_METHODS:
+			self.__dict__.pop(method, None)
+		self.__dict__.pop('locateHost', None)
+		self._unquote 			= urllib.parse.unquote
+		self._unquoteBytes 		= urllib.parse.unquote_to_bytes
+		self._parseStages 		= PARSE_STAGES
+		self._namedStages 		= NAMED_STAGES
+		self._instrumentation 	= None
+		self._bytesUrld 		= None
+
+	def instrumentStats(self):
+		"""
+			Returns the Instrumentation stats with this instance's cache counters, or None when not instrumented
+		"""
+		return self._instrumentation.stats(self) if self._instrumentation is not None else None
+
+	def urlParseEngine(self, urlInput):
+		"""
+			Systematicly Deconstruct the url string left -> right
+			See deconstruct, errors are listed in the results and only raised by strict instances
+		"""
+		#0. 	Clear Vars
+		self._urlComponents 	= {}
+		self._urlString 		= ''
+		try:
+			self._urlString 	= self.deconstruct(urlInput, self._urlComponents)
+
+		except UrlParseError:
+			if self._strict:
+				raise
+
+		except Exception as err:
+			recordFailure(self._urlComponents, urlInput, err)
+			if self._strict:
+				raise UrlParseError(str(err), self._urlComponents, 'input', 0) from err
+			if self._tracebacks:
+				traceback.print_exc()
+
+		#Return Parsed Data
+		return self._urlComponents
+
+	def parse_many(self, urlInputs, errors='record', compact=False, lazy=False):
+		"""
+			Deconstruct every url of an iterable, yielding one urlComponents dict per url
+			Results are streamed, memory use does not grow with the number of urls
+			compact=True yields ParsedUrl objects instead of dicts, lazy=True yields lazy ParsedUrl
+			objects, with errors='record' they are only parsed as far as they are read
+
+			errors decides what happens to a url that can't be deconstructed
+				'record' 	- yield the partial components with a warning_message, like urlParseEngine
+				'skip' 		- yield nothing for that url
+				'raise' 	- raise the error, UrlParseError when no host is found
+		"""
+		if errors not in ('record', 'skip', 'raise'):
+			raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+		if compact or lazy:
+			return self.parseManyCompact(urlInputs, errors, lazy)
+		return self.parseManyDicts(urlInputs, errors)
+
+	def parse_columns(self, urlInputs, columns=COLUMNS, errors='record'):
+		"""
+			Deconstruct every url of an iterable into UrlColumns, one array per column of COLUMNS,
+			without making a dict per url. errors works like parse_many, recorded urls fill the warning column
+		"""
+		if errors not in ('record', 'skip', 'raise'):
+			raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+		table 	= UrlColumns(columns)
+		append 	= table.append
+		for parsed in self.parseManyCompact(urlInputs, errors):
+			append(parsed.row())
+		return table
+
+	def aggregate(self, urlInputs, errors='record', fields=AGGREGATE_FIELDS, limit=AGGREGATE_LIMIT, precision=HLL_PRECISION):
+		"""
+			Deconstruct every url of an iterable into a UrlAggregate, counts per field in bounded memory
+			errors works like parse_many, recorded urls are counted as failed
+		"""
+		if errors not in ('record', 'skip', 'raise'):
+			raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+		return UrlAggregate(fields, limit, precision).update(self.parseManyCompact(urlInputs, errors))
+
+	def canonicalUrl(self, urlInput):
+		"""
+			Returns the canonical form of a url, see ParsedUrl.canonical, None when no host was found
+		"""
+		return self.parseUrl(urlInput).canonical()
+
+	def parse_unique(self, urlInputs, errors='record', compact=False, seen=None):
+		"""
+			parse_many that drops every url whose ParsedUrl.canonicalKey was seen before
+			seen is the dedup filter, a KeySet (exact) by default, or a BloomFilter for bounded memory,
+			any object whose add(key) returns True for new keys will do and it can be shared between calls
+		"""
+		if errors not in ('record', 'skip', 'raise'):
+			raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+		if seen is None:
+			seen = KeySet()
+		if not callable(getattr(seen, 'add', None)):
+			raise TypeError('seen must have an add(key) method, like KeySet or BloomFilter, not %s' % (type(seen).__name__,))
+		return self.parseUniqueResults(urlInputs, errors, compact, seen.add)
+
+	def parseUniqueResults(self, urlInputs, errors, compact, add):
+		"""
+			parse_unique generator, add is the dedup filter's add
+		"""
+		for parsed in self.parseManyCompact(urlInputs, errors):
+			if add(parsed.canonicalKey()):
+				yield parsed if compact else parsed.to_dict()
+
+	def parseManyCompact(self, urlInputs, errors, lazy=False):
+		"""
+			parse_many for ParsedUrl results
+		"""
+		parseUrl 	= self.parseUrl
+		urlInputs 	= iter(urlInputs)
+		block 		= list(itertools.islice(urlInputs, PREFILTER_BLOCK))
+		while block:
+			for (urlInput, named) in zip(block, self.prefilter(block)):
+				try:
+					parsed = parseUrl(urlInput, lazy, named)
+				except Exception as err:
+					if errors == 'raise':
+						raise
+					if errors == 'skip':
+						continue
+					parsed 			= ParsedUrl(self, urlInput, urlInput)
+					parsed._warning = str(err)
+					parsed._stage 	= ParsedUrl.PATH
+					parsed.fail(getattr(err, 'stage', None) or 'input', str(err), getattr(err, 'offset', None) or 0)
+				if (errors != 'record' or not lazy) and parsed.warning is not None:
+					if errors == 'raise':
+						raise parsed.error(parsed.errors[-1])
+					if errors == 'skip':
+						continue
+				yield parsed
+			block = list(itertools.islice(urlInputs, PREFILTER_BLOCK))
+
+	def parseManyDicts(self, urlInputs, errors):
+		"""
+			parse_many for dict results
+		"""
+
+		deconstruct = self.deconstruct
+		for urlInput in urlInputs:
+			urlComponents = {}
+			try:
+				deconstruct(urlInput, urlComponents)
+			except Exception as err:
+				if errors == 'raise':
+					raise
+				if errors == 'skip':
+					continue
+				if 'warning_message' not in urlComponents:
+					recordFailure(urlComponents, urlInput, err)
+			yield urlComponents
+
+
+def recordFailure(urlComponents, urlInput, err):
+	"""
+		Fill urlComponents for a url the parser failed on with err, a warning_message and its error record
+	"""
+	urlComponents.setdefault('input_url', urlInput)
+	urlComponents['warning_message'] = str(err)
+	#Errors of the parse stages are already recorded
+	if 'errors' not in urlComponents:
+		urlComponents['errors'] = [ParseIssue(getattr(err, 'stage', None) or 'input', str(err), getattr(err, 'offset', None) or 0)._asdict()]
+
+#Default size of the byte ranges parse_parallel hands to each worker
+PARALLEL_CHUNK_SIZE 	= 4 * 1024 * 1024
+#Lines per task when the input can't be split by byte range (gzip, stdin)
+PARALLEL_BATCH_LINES 	= 20000
+
+#Urls per executor batch, and batches in flight, for parse_stream
+STREAM_BATCH_SIZE 		= 256
+STREAM_MAX_PENDING 		= 4
+
+#UrlParseServer connection threads, largest request body and seconds an idle connection is kept
+SERVER_THREADS 			= 16
+SERVER_MAX_BODY 		= 16 * 1024 * 1024
+SERVER_IDLE_TIMEOUT 	= 30
+
+#Serializer formats, json is the NDJSON the CLI streams by default, pretty the returnJson layout
+SERIALIZERS 			= ('json', 'pretty', 'orjson', 'msgspec', 'msgpack')
+
+#Per process UrlDeconstruction used by parse_parallel workers
+_workerUrld 			= None
+
+
+def chunkFile(path, chunkSize=PARALLEL_CHUNK_SIZE):
+	"""
+		Split a file into byte ranges of about chunkSize, every range ends on a line boundary
+
+		Returns list of (start, end) tuples
+	"""
+	ranges 	= []
+	size 	= os.path.getsize(path)
+	with open(path, 'rb') as rawFile:
+		start = 0
+		while start < size:
+			end = min(start + chunkSize, size)
+			if end < size:
+				rawFile.seek(end)
+				rawFile.readline()
+				end = rawFile.tell()
+			ranges.append((start, end))
+			start = end
+	return ranges
+
+
+def workerUrld(urldOptions=None):
+	"""
+		Returns the worker process' own UrlDeconstruction, created with urldOptions on first use
+	"""
+	global _workerUrld
+	if _workerUrld is None:
+		_workerUrld = UrlDeconstruction(**(urldOptions or {}))
+	return _workerUrld
+
+
+def taskUrls(task):
+	"""
+		Returns the urls of a parse_parallel task, ('range', path, start, end), ('lines', [line, ...])
+		or ('urls', [url, ...]) for urls that need no stripping
+	"""
+	#Byte ranges are decoded in one go for the str parser, parseBytes is slower than decode + parseUrl on whole urls
+	if task[0] == 'range':
+		(kind, path, start, end) = task
+		with open(path, 'rb') as rawFile:
+			rawFile.seek(start)
+			return readUrls(rawFile.read(end - start).decode('utf-8', 'replace').split('\n'))
+	if task[0] == 'urls':
+		return task[1]
+	return readUrls(task[1])
+
+
+def parseTask(task, errors='record', encoding=None, urldOptions=None):
+	"""
+		Worker side of parse_parallel, parses one task (see taskUrls) with the process' own UrlDeconstruction
+		urldOptions are the UrlDeconstruction keyword arguments, used when the worker creates it
+
+		Returns list of urlComponents dicts, or with encoding, one of SERIALIZERS, one block of
+		the Serializer's records, text for the JSON formats and bytes for MessagePack
+	"""
+	results = workerUrld(urldOptions).parse_many(taskUrls(task), errors=errors)
+	if encoding is None:
+		return list(results)
+	serializer 	= Serializer(encoding)
+	block 		= io.BytesIO() if serializer.binary else io.StringIO()
+	serializer.write(results, block)
+	return block.getvalue()
+
+
+def aggregateTask(task, errors='record', urldOptions=None, aggregateOptions=None):
+	"""
+		Worker side of aggregate_parallel, returns the UrlAggregate of one task
+	"""
+	return workerUrld(urldOptions).aggregate(taskUrls(task), errors, **(aggregateOptions or {}))
+
+
+def parallelTasks(path, chunkSize=PARALLEL_CHUNK_SIZE):
+	"""
+		Yields the parse_parallel tasks for path
+		Plain files are split into byte ranges, gzip files and stdin ('-') are read here in line batches
+	"""
+	if path != '-':
+		with open(path, 'rb') as rawFile:
+			compressed = rawFile.peek(2)[:2] == b'\x1f\x8b'
+		if not compressed:
+			for (start, end) in chunkFile(path, chunkSize):
+				yield ('range', path, start, end)
+			return
+
+	inFile = openUrlFile(path)
+	try:
+		while True:
+			lines = list(itertools.islice(inFile, PARALLEL_BATCH_LINES))
+			if not lines: break
+			yield ('lines', lines)
+	finally:
+		inFile.close()
+
+
+def runTasks(function, tasks, workers=None, ordered=True, *args):
+	"""
+		Run function(task, *args) for every task on a process pool, yields the results
+		At most two tasks per worker are in flight, so memory stays bounded on huge inputs
+		ordered=False yields in completion order, which keeps every worker busy
+	"""
+	workers 	= workers or os.cpu_count() or 1
+	pending 	= collections.deque()
+	pool 		= concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+	try:
+		for task in itertools.islice(tasks, workers * 2):
+			pending.append(pool.submit(function, task, *args))
+
+		while pending:
+			if ordered:
+				future = pending.popleft()
+			else:
+				(done, notDone) = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+				future = done.pop()
+				pending.remove(future)
+			output = future.result()
+
+			for task in itertools.islice(tasks, 1):
+				pending.append(pool.submit(function, task, *args))
+			yield output
+
+	finally:
+		pool.shutdown(wait=True, cancel_futures=True)
+
+
+def parallelChunks(path, workers=None, ordered=True, chunkSize=PARALLEL_CHUNK_SIZE, errors='record', encoding=None, urldOptions=None):
+	"""
+		Fan the tasks of path out to a process pool, yields each task's output, see parseTask and runTasks
+	"""
+	if errors not in ('record', 'skip', 'raise'):
+		raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+
+	for output in runTasks(parseTask, parallelTasks(path, chunkSize), workers, ordered, errors, encoding, urldOptions):
+		yield output
+
+
+def parse_parallel(path, workers=None, ordered=True, chunkSize=PARALLEL_CHUNK_SIZE, errors='record', **urldOptions):
+	"""
+		Deconstruct every url of a newline-delimited file using a pool of worker processes
+		Plain files are split into byte ranges on line boundaries, each worker parses its own
+		ranges with its own UrlDeconstruction, gzip files and stdin ('-') are sent in line batches
+
+		Yields urlComponents dicts, in input order unless ordered=False
+		errors is handled as in UrlDeconstruction.parse_many, other keyword arguments
+		(cacheSize, hostCacheSize) are passed to each worker's UrlDeconstruction
+	"""
+	for results in parallelChunks(path, workers, ordered, chunkSize, errors, urldOptions=urldOptions):
+		for urlComponents in results:
+			yield urlComponents
+
+
+def aggregate_parallel(path, workers=None, chunkSize=PARALLEL_CHUNK_SIZE, errors='record', fields=AGGREGATE_FIELDS,
+					   limit=AGGREGATE_LIMIT, precision=HLL_PRECISION, **urldOptions):
+	"""
+		UrlDeconstruction.aggregate over a newline-delimited file using a pool of worker processes
+		Each worker aggregates its own tasks, the partial UrlAggregate objects are merged as they finish
+
+		Returns the UrlAggregate of the whole file
+	"""
+	if errors not in ('record', 'skip', 'raise'):
+		raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+
+	aggregateOptions 	= {'fields': fields, 'limit': limit, 'precision': precision}
+	aggregate 			= UrlAggregate(fields, limit, precision)
+	for partial in runTasks(aggregateTask, parallelTasks(path, chunkSize), workers, False, errors, urldOptions, aggregateOptions):
+		aggregate.merge(partial)
+	return aggregate
+
+
+async def parse_stream(source, executor=None, batchSize=STREAM_BATCH_SIZE, maxPending=STREAM_MAX_PENDING, errors='record', **urldOptions):
+	"""
+		Deconstruct the urls of an asyncio.StreamReader, or any async iterable of str / bytes lines,
+		without blocking the event loop
+		Lines are gathered in batches of batchSize urls, each batch is parsed on executor, the loop's
+		default thread pool when None. A ProcessPoolExecutor gets parseTask tasks, each worker
+		process uses its own UrlDeconstruction
+		Once maxPending batches are in flight nothing more is read from source until the oldest
+		one is done, so a slow consumer slows the reader down instead of queueing up results
+
+		Async yields urlComponents dicts, in input order
+		errors is handled as in UrlDeconstruction.parse_many, other keyword arguments
+		(cacheSize, hostCacheSize) are passed to the UrlDeconstruction
+	"""
+	if errors not in ('record', 'skip', 'raise'):
+		raise ValueError("errors must be 'record', 'skip' or 'raise', not %r" % (errors,))
+
+	loop 	= asyncio.get_running_loop()
+	urld 	= UrlDeconstruction(**urldOptions)
+	if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+		submit = lambda batch: loop.run_in_executor(executor, parseTask, ('lines', batch), errors, None, urldOptions)
+	else:
+		submit = lambda batch: loop.run_in_executor(executor, lambda: list(urld.parse_many(batch, errors=errors)))
+
+	pending = collections.deque()
+	batch 	= []
+	try:
+		async for line in source:
+			#Bytes lines stay bytes for parseBytes, see readUrlBytes
+			for urlInput in (readUrlBytes if type(line) is bytes else readUrls)((line,)):
+				batch.append(urlInput)
+			if len(batch) < batchSize:
+				continue
+			pending.append(submit(batch))
+			batch = []
+
+			#Hand back finished batches, wait on the oldest one when too many are in flight
+			while pending and (pending[0].done() or len(pending) >= maxPending):
+				for urlComponents in await pending.popleft():
+					yield urlComponents
+
+		if batch:
+			pending.append(submit(batch))
+		while pending:
+			for urlComponents in await pending.popleft():
+				yield urlComponents
+
+	finally:
+		for future in pending:
+			future.cancel()
+
+
+def openUrlFile(path):
+	"""
+		Open a newline-delimited url file for reading, '-' reads stdin
+		gzip input is detected from its magic bytes, so stdin may be compressed too
+
+		Returns a text file object
+	"""
+	rawFile = sys.stdin.buffer if path == '-' else open(path, 'rb')
+	if rawFile.peek(2)[:2] == b'\x1f\x8b':
+		rawFile = gzip.GzipFile(fileobj=rawFile)
+	return io.TextIOWrapper(rawFile, encoding='utf-8', errors='replace')
+
+
+def readUrls(lines):
+	"""
+		Yields the urls of an iterable of lines, surrounding whitespace removed and blank lines skipped
+	"""
+	for line in lines:
+		line = line.strip()
+		if line: yield line
+
+
+def readUrlBytes(lines):
+	"""
+		readUrls for bytes lines, stripped the way their utf-8 decoded text would be
+		Lines holding non ASCII bytes are decoded, ASCII ones stay bytes for parseBytes
+	"""
+	for line in lines:
+		line = line.strip(ASCII_WHITESPACE)
+		if line and not line.isascii():
+			line = line.decode('utf-8', 'replace').strip()
+		if line: yield line
 
-		Notes:
-			Update updateStates function to order the dict by keys
+
+class Serializer:
 	"""
+		Serializer Class
 
-	def __init__(self):
+		Encodes urlComponents dicts, format is one of SERIALIZERS
+			'pretty' 	- the returnJson layout, sorted keys and 4 space indent
+			'json' 		- compact JSON, keys in the fixed order the parse stages write them, so nothing is sorted
+			'orjson' 	- compact JSON by orjson, 'msgspec' by msgspec.json, both optional, same key order
+			'msgpack' 	- MessagePack, by the msgpack package when it is installed, packMsgpack otherwise
+
+		dumps() gives the text of one result for the JSON formats, encode() the bytes for every format
+		record() frames one result, JSON records end with a newline, MessagePack ones have a 4 byte
+		big-endian length in front. write() / read() handle a stream of them
+	"""
+
+	def __init__(self, format='json'):
+		if format not in SERIALIZERS:
+			raise ValueError('format must be one of %s, not %r' % (', '.join(SERIALIZERS), format))
 		#Initialize Variables
-		self._urlComponents 	= {}
-		self._urlString 		= ''
+		self.format = format
+		self.binary = format == 'msgpack'
+		self.dumps 	= None
+		if format == 'pretty':
+			self.dumps 	= lambda components: json.dumps(components, sort_keys=True, indent=4, separators=(',', ': '))
+			self.decode = json.loads
+		elif format == 'json':
+			self.dumps 	= json.JSONEncoder(separators=(',', ':')).encode
+			self.decode = json.loads
+		elif format == 'orjson':
+			orjson 		= self.backend('orjson')
+			self.encode = orjson.dumps
+			self.decode = orjson.loads
+		elif format == 'msgspec':
+			msgspec 	= self.backend('msgspec')
+			self.encode = msgspec.json.Encoder().encode
+			self.decode = msgspec.json.Decoder().decode
+		else:
+			try:
+				import msgpack
+			except ImportError:
+				(self.encode, self.decode) = (packMsgpack, unpackMsgpack)
+			else:
+				self.encode = msgpack.Packer(use_bin_type=True).pack
+				self.decode = lambda data: msgpack.unpackb(data, raw=False)
 
-	def findPattern(self, patternList, testString):
-		"""
-			Takes a dict of patterns, finds match against testString
-			First one to match wins
-			
-			Returns dict key or None if unable to find match
-		"""
+		#json / pretty are str first, the other JSON formats bytes first
+		if self.dumps is not None:
+			dumps 		= self.dumps
+			self.encode = lambda components: dumps(components).encode('utf-8')
+		elif not self.binary:
+			encode 		= self.encode
+			self.dumps 	= lambda components: encode(components).decode('utf-8')
+
+	@staticmethod
+	def backend(name):
 		try:
-			for regExpKey in patternList.keys():
-				regExpPattern = patternList[regExpKey]
-				pattern = regExpPattern.match(testString)
-				if pattern:
-					return regExpKey
-			else:
-				return False
-		except Exception:
-			traceback.print_exc()
+			return __import__(name)
+		except ImportError:
+			raise ImportError('the %s format needs %s, pip3 install %s' % (name, name, name))
 
-	def updateStates(self, data):
+	def record(self, urlComponents):
 		"""
-			Update the current urlString State as well as the urlComponents Dict
-			#Takes tupil (urlComponents, urlString)
+			Returns one framed record, see the class notes
 		"""
-		try:
-			(components, urlString) = data
-			self._urlString 		= urlString
-			self._urlComponents.update(components)
-		except Exception:
-			traceback.print_exc()
+		data = self.encode(urlComponents)
+		if self.binary:
+			return len(data).to_bytes(4, 'big') + data
+		return data + b'\n'
 
-	def returnJson(self):
+	def output(self, outFile):
 		"""
-			Returns urlComponents out as JSON friendly string
+			Returns (write, text), the function records for outFile are written with and whether it takes str
+			Text files (sys.stdout, StringIO) take the JSON formats as text, MessagePack goes to their binary buffer
 		"""
-		return json.dumps(self._urlComponents, sort_keys=True, indent=4, separators=(',', ': '))
+		text = isinstance(outFile, io.TextIOBase)
+		if text and self.binary:
+			outFile.flush()
+			return (outFile.buffer.write, False)
+		return (outFile.write, text)
 
-	def parseIpv4(self, urlString):
+	def write(self, results, outFile, batchSize=1024):
 		"""
-			Attempt to get IPv4 w/ Port from the url string input
+			Write the records of urlComponents dicts to outFile, see output()
+			Records are joined and written batchSize at a time to keep write calls down
 		"""
-		try:
-			#Standard Dotted Notation
-			regDotNot	=	re.compile('^((?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?))(:([\d]{1,5})(/|$)|/|$)')
-			#Dotted Hexadecimal
-			regDotHex	=	re.compile('^(0x[A-F0-9]{2}\.0x[A-F0-9]{2}\.0x[A-F0-9]{2}\.0x[A-F0-9]{2})(:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
-			#Dotted Octal
-			regDotOct	=	re.compile('^([\d]{4}\.[\d]{4}\.[\d]{4}\.[\d]{4})(:([\d]{1,5})(/|$)|/|$)')
-			#Hexadecimal
-			regHexDec	=	re.compile('^(0x[\dA-F]{8})(:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
-			#Octal
-			regOct		=	re.compile('^([\d]{12})(:([\d]{1,5})(/|$)|/|$)')
-			#Decimal
-			regDec 		=	re.compile('^([\d]{10})(:([\d]{1,5})(/|$)|/|$)')
-
-			#Collection of patterns
-			ipv4RegPatterns	=	 {	'DotNot' : regDotNot,
-								  	'DotHex' : regDotHex,
-								  	'DotOct' : regDotOct,
-								  	'HexDec' : regHexDec,
-								  	'Oct'	 : regOct,
-								  	'Dec'	 : regDec}
+		(write, text) 	= self.output(outFile)
+		(encode, join) 	= (self.dumps, '\n'.join) if text else (self.record, b''.join)
+		batch 			= []
+		for components in results:
+			batch.append(encode(components))
+			if len(batch) >= batchSize:
+				#Text records end with a newline too
+				if text: batch.append('')
+				write(join(batch))
+				batch = []
+		if batch:
+			if text: batch.append('')
+			write(join(batch))
+		outFile.flush()
 
-			#Create Dict & vars for results
-			results 		= {}
-			results['ipv4'] = {}
-			newUrlString	= ''
-
-			#Find Pattern to use
-			regExpKey	= self.findPattern(ipv4RegPatterns, urlString)
+	def read(self, inFile):
+		"""
+			Yields the urlComponents dicts of the records in a binary file
+		"""
+		if not self.binary:
+			#Pretty records span lines, they are separated by the '}' line that closes them
+			if self.format == 'pretty':
+				document = []
+				for line in inFile:
+					document.append(line)
+					if line.rstrip() == b'}':
+						yield self.decode(b''.join(document))
+						document = []
+				return
+			for line in inFile:
+				if line.strip():
+					yield self.decode(line)
+			return
+		while True:
+			prefix = inFile.read(4)
+			if len(prefix) < 4:
+				return
+			yield self.decode(inFile.read(int.from_bytes(prefix, 'big')))
 
-			#Parse urlString
-			if regExpKey:
-				regPattern 	= ipv4RegPatterns[regExpKey]
-				out 		= [m for m in regPattern.findall(urlString)]
-				ipv4Data	= [(w,y, len(w+x)) for w,x,y,z in out][0]
-				ipAddress	= ipv4Data[0]
-				ipPort		= ipv4Data[1]
-				splitPos	= ipv4Data[2]
-				if ipPort:					results['ipv4']['port'] = ipPort
-				if regExpKey != 'DotNot':	results['ipv4']['notation'] = str(netaddr.IPAddress(ipAddress))
-				results['ipv4']['address'] 			= ipAddress
-				results['ipv4']['type'] 			= regExpKey.lower()
-
-				newUrlString = urlString[splitPos:]
 
-			else:
-				results =  None
+def packMsgpack(value, out=None):
+	"""
+		Returns the MessagePack encoding of value, None, bool, int, float, str, bytes, list, tuple and dict
+		Used by Serializer when the msgpack package isn't installed, gives the same bytes as msgpack.packb
+	"""
+	if out is None:
+		out = bytearray()
+		packMsgpack(value, out)
+		return bytes(out)
+	valueType = type(value)
+	if valueType is str:
+		data = value.encode('utf-8', 'surrogatepass')
+		size = len(data)
+		if size < 32: 			out.append(0xa0 | size)
+		elif size < 0x100: 		out += b'\xd9' + size.to_bytes(1, 'big')
+		elif size < 0x10000: 	out += b'\xda' + size.to_bytes(2, 'big')
+		else: 					out += b'\xdb' + size.to_bytes(4, 'big')
+		out += data
+	elif valueType is dict:
+		size = len(value)
+		if size < 16: 			out.append(0x80 | size)
+		elif size < 0x10000: 	out += b'\xde' + size.to_bytes(2, 'big')
+		else: 					out += b'\xdf' + size.to_bytes(4, 'big')
+		for (key, item) in value.items():
+			packMsgpack(key, out)
+			packMsgpack(item, out)
+	elif valueType is list or valueType is tuple:
+		size = len(value)
+		if size < 16: 			out.append(0x90 | size)
+		elif size < 0x10000: 	out += b'\xdc' + size.to_bytes(2, 'big')
+		else: 					out += b'\xdd' + size.to_bytes(4, 'big')
+		for item in value:
+			packMsgpack(item, out)
+	elif value is None:
+		out.append(0xc0)
+	elif valueType is bool:
+		out.append(0xc3 if value else 0xc2)
+	elif valueType is int:
+		if 0 <= value < 0x80: 			out.append(value)
+		elif -32 <= value < 0: 			out.append(value & 0xff)
+		elif 0 <= value < 0x100: 		out += b'\xcc' + value.to_bytes(1, 'big')
+		elif 0 <= value < 0x10000: 		out += b'\xcd' + value.to_bytes(2, 'big')
+		elif 0 <= value < 0x100000000: 	out += b'\xce' + value.to_bytes(4, 'big')
+		elif 0 <= value < 1 << 64: 		out += b'\xcf' + value.to_bytes(8, 'big')
+		elif -0x80 <= value: 			out += b'\xd0' + value.to_bytes(1, 'big', signed=True)
+		elif -0x8000 <= value: 			out += b'\xd1' + value.to_bytes(2, 'big', signed=True)
+		elif -0x80000000 <= value: 		out += b'\xd2' + value.to_bytes(4, 'big', signed=True)
+		elif -(1 << 63) <= value: 		out += b'\xd3' + value.to_bytes(8, 'big', signed=True)
+		else:
+			raise OverflowError('%r is too large for MessagePack' % (value,))
+	elif valueType is float:
+		out += b'\xcb' + struct.pack('>d', value)
+	elif valueType is bytes or valueType is bytearray:
+		size = len(value)
+		if size < 0x100: 		out += b'\xc4' + size.to_bytes(1, 'big')
+		elif size < 0x10000: 	out += b'\xc5' + size.to_bytes(2, 'big')
+		else: 					out += b'\xc6' + size.to_bytes(4, 'big')
+		out += value
+	else:
+		raise TypeError('can\'t pack %s as MessagePack' % (valueType.__name__,))
 
-		except Exception:
-			traceback.print_exc()
 
-		finally:
-			#Return results
-			return (results, newUrlString)
+def unpackMsgpack(data):
+	"""
+		Returns the value of one MessagePack document, the types packMsgpack writes
+	"""
+	(value, pos) = unpackValue(data, 0)
+	if pos != len(data):
+		raise ValueError('%d bytes left after the MessagePack value' % (len(data) - pos,))
+	return value
 
-	def parseIpv6(self, urlString):
-		"""
-			Attempt to get IPv6 w/ Port from the url string input
-		"""
-		try:
-			#Standard and Abbv Version
-			regStd	=	re.compile('^\[([0-9a-f:%\./]*)\](:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
-			#Oct
-			regOct	=	re.compile('^([\d]{39})(:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
 
-			#Collection of patterns
-			ipv6RegPatterns	=	 {	'Std' : regStd,
-								  	'Oct' : regOct}
+def unpackValue(data, pos):
+	"""
+		Returns (value, position after it) of the MessagePack value at pos
+	"""
+	code = data[pos]
+	pos += 1
+	#Fixed size forms, the length is in the code
+	if code < 0x80: 	return (code, pos)
+	if code >= 0xe0: 	return (code - 0x100, pos)
+	if code < 0x90: 	(kind, size) = ('map', code & 0x0f)
+	elif code < 0xa0: 	(kind, size) = ('array', code & 0x0f)
+	elif code < 0xc0: 	(kind, size) = ('str', code & 0x1f)
+	elif code == 0xc0: 	return (None, pos)
+	elif code == 0xc2: 	return (False, pos)
+	elif code == 0xc3: 	return (True, pos)
+	elif code == 0xcb: 	return (struct.unpack_from('>d', data, pos)[0], pos + 8)
+	elif code == 0xca: 	return (struct.unpack_from('>f', data, pos)[0], pos + 4)
+	elif 0xcc <= code <= 0xd3:
+		width = 1 << ((code - 0xcc) & 3)
+		return (int.from_bytes(data[pos:pos+width], 'big', signed=code >= 0xd0), pos + width)
+	else:
+		forms = {0xc4: ('bin', 1), 0xc5: ('bin', 2), 0xc6: ('bin', 4), 0xd9: ('str', 1), 0xda: ('str', 2), 0xdb: ('str', 4),
+				 0xdc: ('array', 2), 0xdd: ('array', 4), 0xde: ('map', 2), 0xdf: ('map', 4)}
+		if code not in forms:
+			raise ValueError('unsupported MessagePack type 0x%02x' % (code,))
+		(kind, width) 	= forms[code]
+		size 			= int.from_bytes(data[pos:pos+width], 'big')
+		pos 			+= width
 
-			#Create Dict & vars for results
-			results 		= {}
-			results['ipv6'] = {}
-			newUrlString 	= ''
+	if kind == 'str':
+		return (bytes(data[pos:pos+size]).decode('utf-8', 'surrogatepass'), pos + size)
+	if kind == 'bin':
+		return (bytes(data[pos:pos+size]), pos + size)
+	if kind == 'array':
+		items = []
+		for index in range(size):
+			(item, pos) = unpackValue(data, pos)
+			items.append(item)
+		return (items, pos)
+	mapping = {}
+	for index in range(size):
+		(key, pos) = unpackValue(data, pos)
+		(mapping[key], pos) = unpackValue(data, pos)
+	return (mapping, pos)
 
-			#Find Pattern to use
-			regExpKey	= self.findPattern(ipv6RegPatterns, urlString)
 
-			#Parse urlString
-			if regExpKey:
-				regPattern 	= ipv6RegPatterns[regExpKey]
-				out 		= [m for m in regPattern.findall(urlString)]
-				ipv6Data	= [(w,y, len(w+x)) for w,x,y,z in out][0]
-				ipAddress	= ipv6Data[0]
-				ipPort		= ipv6Data[1]
-				if ipPort:	results['ipv6']['port'] = ipPort
-				if regExpKey != 'Std': 
-					results['ipv6']['standard'] = str(netaddr.IPAddress(int(ipAddress)))
-					splitPos = ipv6Data[2]
-				elif regExpKey == 'Std':
-					splitPos = ipv6Data[2] + 2 #We need to account for the space taken by the brackets
-				else:
-					pass
-				results['ipv6']['address'] 			= ipAddress.lower()
-				results['ipv6']['type'] 			= regExpKey.lower()
-				
-				newUrlString = urlString[splitPos:]
-			
-			else:
-				results = None
+class ServerMetrics:
+	"""
+		ServerMetrics Class
 
-		except Exception:
-			traceback.print_exc()
+		Request, url and byte counters plus the request latency histogram of a UrlParseServer
+	"""
 
-		finally:
-			#Return results
-			return (results, newUrlString)
+	def __init__(self):
+		#Initialize Variables
+		self.requests 	= collections.Counter()
+		self.urls 		= 0
+		self.bytesIn 	= 0
+		self.latency 	= LatencyHistogram()
+		self._lock 		= threading.Lock()
 
-	def parseDomain(self, urlString):
+	def record(self, path, code, seconds, urls=0, bytesIn=0):
 		"""
-			Attempt to get Domain details from url string
+			Count one handled request
 		"""
-		try:
-			#Domain Regex
-			regDom		=	re.compile('^([\w\-\.]*\.[\w]*)(:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
-			regHst		=	re.compile('^(localhost)(:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
-			regLoc		=	re.compile('^([\w\-\.]{1,}[a-z]{1})(:([\d]{1,5})(/|$)|/|$)', re.IGNORECASE)
+		with self._lock:
+			self.requests[(path, code)] += 1
+			self.urls 					+= urls
+			self.bytesIn 				+= bytesIn
+		if path == '/parse':
+			self.latency.observe(seconds)
 
-			#Collection of patterns
-			domRegPatterns	=	 {	'Dom' : regDom,
-								  	'Loc' : regLoc,
-								  	'Hst' : regHst}
-
-			#Create Dict & vars for results
-			results 			= {}
-			results['domain'] 	= {}
-			newUrlString		= ''
+	def prometheus(self, urld=None):
+		"""
+			Returns the metrics as Prometheus text, with urld's cache counters when it has caches
+			and its stage timings when it is instrumented
+		"""
+		lines = ['# HELP urlparser_requests_total HTTP requests handled, by path and status code',
+				 '# TYPE urlparser_requests_total counter']
+		with self._lock:
+			for (path, code), count in sorted(self.requests.items()):
+				lines.append('urlparser_requests_total{path="%s",code="%d"} %d' % (path, code, count))
+			lines += ['# HELP urlparser_urls_total Urls parsed', '# TYPE urlparser_urls_total counter',
+					  'urlparser_urls_total %d' % self.urls,
+					  '# HELP urlparser_request_bytes_total Request body bytes read', '# TYPE urlparser_request_bytes_total counter',
+					  'urlparser_request_bytes_total %d' % self.bytesIn]
+		lines += ['# HELP urlparser_request_duration_seconds Time to handle a /parse request',
+				  '# TYPE urlparser_request_duration_seconds histogram']
+		lines += self.latency.prometheus('urlparser_request_duration_seconds')
+		if urld is not None:
+			lines += cachePrometheus(urld)
+		text = '\n'.join(lines) + '\n'
+		if urld is not None and urld._instrumentation is not None:
+			text += urld._instrumentation.prometheus()
+		return text
 
-			#Find Pattern to use
-			regExpKey	= self.findPattern(domRegPatterns, urlString)
 
-			#Parse urlString
-			if regExpKey:
-				regPattern 	= domRegPatterns[regExpKey]
-				out 		= [m for m in regPattern.findall(urlString)]
-				fqdnData 	= [(w,y, len(w+x)) for w,x,y,z in out][0]
-				fqdn 		= fqdnData[0]
-				port 		= fqdnData[1]
-				splitPos	= fqdnData[2]
-				tldPos 		= fqdn.rfind('.') + 1 if fqdn.find('.') != -1 else None
-				tld 		= fqdn[tldPos:]
-				if port: 	results['domain']['port']	= port
-				if fqdn: 	results['domain']['fqdn']	= fqdn
-				if tldPos:	results['domain']['tld']	= tld
-
-				#Extract SLD Information
-				subData = [(x.start(), x.end()) for x in re.finditer('\.', fqdn)] # Get tuples of all '.' positions
-				if len(subData) == 1:	# Domain contains only SLD
-					results['domain']['sld'] 	= fqdn[:subData[0][0]]
-				elif len(subData) > 1:	# Domain has more then one sub domain
-					posSLD 						= (subData[len(subData)-2][1], subData[len(subData)-1][0])
-					results['domain']['sld'] 	= fqdn[posSLD[0]:posSLD[1]]
-					posHostSLD					= posSLD[0] -1
-					results['domain']['host'] 	= fqdn[:posHostSLD]
-				else:
-					pass
-				
-				newUrlString = urlString[splitPos:]
+class UrlParseHandler(http.server.BaseHTTPRequestHandler):
+	"""
+		UrlParseHandler Class
 
-			else:
-				results =  None
+		POST /parse 	- body is a JSON array of urls or NDJSON (one JSON string per line),
+						  answered in the same form with one urlComponents dict per url
+						  ?errors=record|skip|raise overrides the server default
+		GET /metrics 	- Prometheus text metrics
+		HTTP/1.1, connections are kept alive between requests
+	"""
 
-		except Exception:
-			traceback.print_exc()
+	protocol_version 	= 'HTTP/1.1'
+	server_version 		= 'urlParser'
+	timeout 			= SERVER_IDLE_TIMEOUT
 
-		finally:
-			#Return results
-			return (results, newUrlString)
+	def log_request(self, code='-', size='-'):
+		#No access log, /metrics has the counts
+		pass
 
-	def parseScheme(self, urlString):
+	def sendBody(self, code, body, contentType='application/json'):
 		"""
-			Attempt to get Application Scheme from url string
+			Send a complete response, body is str
 		"""
-		try:
-			#Scheme Regex
-			regScheme	=	re.compile('^([\w-]*)://')
-
-			#Create Dict & vars for results
-			results 			= {}
-			results['scheme'] 	= {}
-			newUrlString		= ''
+		data = body.encode('utf-8')
+		self.send_response(code)
+		self.send_header('Content-Type', contentType)
+		self.send_header('Content-Length', str(len(data)))
+		if self.close_connection:
+			self.send_header('Connection', 'close')
+		self.end_headers()
+		self.wfile.write(data)
 
-			#Parse urlString
-			out = [m.end(0) for m in regScheme.finditer(urlString)]
-			if out:
-				results['scheme'] 	= urlString[:out[0]]
-				newUrlString 		= urlString[out[0]:]
-
-			else:
-				results = None
+	def sendError(self, code, message):
+		self.sendBody(code, json.dumps({'error': message}) + '\n')
+		return code
 
-		except Exception:
-			traceback.print_exc()
+	def do_GET(self):
+		started = time.perf_counter()
+		path 	= urllib.parse.urlsplit(self.path).path
+		if path == '/metrics':
+			self.sendBody(200, self.server.metrics.prometheus(self.server.urld), 'text/plain; version=0.0.4')
+			code = 200
+		else:
+			code = self.sendError(404, 'unknown path %s' % path)
+		self.server.metrics.record(path if code != 404 else 'other', code, time.perf_counter() - started)
 
-		finally:
-			#Return results
-			return (results, newUrlString)	
+	def do_POST(self):
+		started 			= time.perf_counter()
+		(code, urls, size) 	= self.handleParse()
+		path 				= urllib.parse.urlsplit(self.path).path
+		self.server.metrics.record(path if code != 404 else 'other', code, time.perf_counter() - started, urls, size)
 
-	def parseCredentials(self, urlString):
+	def handleParse(self):
 		"""
-			Attempt to get Credentials from url string
+			Read, parse and answer one POST /parse
+
+			Returns tuple (status code, urls parsed, body bytes read)
 		"""
-		try:
-			#Credential Regex
-			regCreds	=	re.compile('^([\w]*):([\w]*)@|([a-z0-9]*)@')
+		request = urllib.parse.urlsplit(self.path)
+		errors 	= urllib.parse.parse_qs(request.query).get('errors', [self.server.errors])[-1]
+		#Nothing of the body is read before these checks, it can't be skipped so the connection is closed
+		closeAfter 				= self.close_connection
+		self.close_connection 	= True
+		if request.path != '/parse':
+			return (self.sendError(404, 'unknown path %s' % request.path), 0, 0)
+		if errors not in ('record', 'skip', 'raise'):
+			return (self.sendError(400, "errors must be 'record', 'skip' or 'raise'"), 0, 0)
+		if 'chunked' in self.headers.get('Transfer-Encoding', '').lower() or self.headers.get('Content-Length') is None:
+			return (self.sendError(411, 'Content-Length required'), 0, 0)
+		size = int(self.headers['Content-Length']) if self.headers['Content-Length'].strip().isdigit() else -1
+		if size < 0:
+			return (self.sendError(400, 'bad Content-Length'), 0, 0)
+		if size > self.server.maxBodySize:
+			return (self.sendError(413, 'request body over %d bytes' % self.server.maxBodySize), 0, 0)
+		body 					= self.rfile.read(size)
+		self.close_connection 	= closeAfter
 
-			#Create Dict & vars for results
-			results 				= {}
-			results['credential'] 	= {}
-			newUrlString 			= ''
+		#JSON array, otherwise NDJSON
+		try:
+			text 		= body.decode('utf-8')
+			isArray 	= text.lstrip().startswith('[')
+			urlInputs 	= json.loads(text) if isArray else [json.loads(line) for line in text.splitlines() if line.strip()]
+			if type(urlInputs) is not list or not all(type(urlInput) is str for urlInput in urlInputs):
+				raise ValueError('expected a list of url strings')
+		except ValueError as err:
+			return (self.sendError(400, 'bad request body, %s' % err), 0, size)
 
-			#Parse urlString
-			out = [m.end(0) for m in regCreds.finditer(urlString)]
-			if out:
-				credString	= urlString[:(out[0]-1)]
-				#Seperate User:Pass if present
-				if credString.find(':') > 0:
-					(credUser, credPass) 				= credString.split(':')
-					results['credential']['username'] 	= credUser
-					results['credential']['password'] 	= credPass
-				else:
-					results['credential']['username'] 	= credString
+		try:
+			lines = self.server.parseUrls(urlInputs, errors).splitlines()
+		except UrlParseError as err:
+			return (self.sendError(422, str(err)), len(urlInputs), size)
 
-				newUrlString = urlString[out[0]:]
-				
-			else:
-				results =  None
+		if isArray:
+			self.sendBody(200, '[' + ','.join(lines) + ']\n')
+		else:
+			self.sendBody(200, ''.join(line + '\n' for line in lines), 'application/x-ndjson')
+		return (200, len(urlInputs), size)
 
-		except Exception:
-			traceback.print_exc()
 
-		finally:
-			#Return results
-			return (results, newUrlString)
+class UrlParseServer(http.server.HTTPServer):
+	"""
+		UrlParseServer Class
 
-	def parseAnchor(self, urlString):
-		"""
-			Attempt to get Anchor from url string
-		"""	
-		try:
-			#Create Dict & vars for results
-			results 			= {}
-			newUrlString 		= ''
+		HTTP front end for UrlDeconstruction, see UrlParseHandler for the endpoints
+		Connections are handled by a pool of threads, urls are parsed on the
+		connection's thread or, with workers, sent to a pool of worker processes
+		Request bodies over maxBodySize bytes are refused
+		instrument=True adds the parse stage timings to /metrics, see UrlDeconstruction.instrument
+	"""
 
-			#If urlString Contains an Anchor, extract that now
-			if urlString.find("#") >= 0:
-				anchorPos 			= urlString.find('#')
-				results['#'] 		= urlString[anchorPos+1:]
-				newUrlString		= urlString[:anchorPos]
+	def __init__(self, address, threads=SERVER_THREADS, workers=None, maxBodySize=SERVER_MAX_BODY, errors='record', instrument=False, **urldOptions):
+		#Initialize Variables
+		self.urld 			= UrlDeconstruction(**urldOptions)
+		if instrument: self.urld.instrument()
+		self.urldOptions 	= urldOptions
+		self.serializer 	= Serializer('json')
+		self.errors 		= errors
+		self.maxBodySize 	= maxBodySize
+		self.metrics 		= ServerMetrics()
+		self._threads 		= concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+		self._processes 	= concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) if workers is not None else None
+		self._connections 	= set()
+		self._lock 			= threading.Lock()
+		http.server.HTTPServer.__init__(self, address, UrlParseHandler)
 
-			else:
-				results = None
+	def process_request(self, request, clientAddress):
+		"""
+			Hand the connection to the thread pool, it stays on one thread while kept alive
+		"""
+		self._threads.submit(self.processRequestThread, request, clientAddress)
 
+	def processRequestThread(self, request, clientAddress):
+		with self._lock:
+			self._connections.add(request)
+		try:
+			self.finish_request(request, clientAddress)
 		except Exception:
-			traceback.print_exc()
-
+			self.handle_error(request, clientAddress)
 		finally:
-			#Return results
-			return (results, newUrlString)
+			with self._lock:
+				self._connections.discard(request)
+			self.shutdown_request(request)
 
-	def parsePath(self, urlString):
+	def parseUrls(self, urlInputs, errors):
 		"""
-			Attempt to get Path Information from url string
+			Returns the NDJSON text of urlInputs' urlComponents dicts
 		"""
-		try:
-			#Path Regex
-			regPath		=	re.compile('^([\w\./\(\,)\-]*)')			
+		if self._processes is not None:
+			return self._processes.submit(parseTask, ('urls', urlInputs), errors, 'json', self.urldOptions).result()
+		textBlock = io.StringIO()
+		self.serializer.write(self.urld.parse_many(urlInputs, errors=errors), textBlock)
+		return textBlock.getvalue()
 
-			#Create Dict & vars for results
-			results 			= {}
-			results['path'] 	= {}
-			newUrlString 		= ''
+	def server_close(self):
+		"""
+			Stop listening and drop the kept alive connections, their threads end on the closed socket
+		"""
+		http.server.HTTPServer.server_close(self)
+		with self._lock:
+			for request in self._connections:
+				try:
+					request.shutdown(socket.SHUT_RDWR)
+				except OSError:
+					pass
+		self._threads.shutdown(wait=False, cancel_futures=True)
+		if self._processes is not None:
+			self._processes.shutdown(wait=True, cancel_futures=True)
 
-			#Parse urlString
-			out = regPath.match(urlString)
-			if out:
-				#If the path is empty, return None with empty url string
-				if out.groups()[0] != '':
-					results['path'] = out.groups()[0]
-					newUrlString 	= urlString[out.end()+1:]
-				else:
-					results = None
-			else:
-				results = None
 
-		except Exception:
-			traceback.print_exc()
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Parse urls into their individual components, output as JSON',
+									 epilog=USAGE_DOC, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('url', nargs='?', help='single url to parse, printed as a pretty JSON document')
+	source = parser.add_mutually_exclusive_group()
+	source.add_argument('--stdin', action='store_true', help='read newline-delimited urls from stdin')
+	source.add_argument('--input', metavar='FILE', help='read newline-delimited urls from FILE (gzip is detected)')
+	parser.add_argument('--pretty', action='store_true', help='pretty print every result instead of writing NDJSON')
+	parser.add_argument('--format', choices=SERIALIZERS,
+						help='output format, json (NDJSON, default for streams), pretty (default for a single url), orjson / msgspec '
+							 '(faster JSON, need the package) or msgpack (4 byte length + MessagePack record per url)')
+	parser.add_argument('--csv', action='store_true', help='write one CSV row per url instead of NDJSON, see COLUMNS')
+	parser.add_argument('--npz', metavar='FILE', help='write the columns to FILE as NumPy arrays instead of NDJSON (needs numpy)')
+	parser.add_argument('--aggregate', action='store_true',
+						help='write one JSON summary instead of the results, url counts and the top values of every field')
+	parser.add_argument('--top', type=int, default=AGGREGATE_TOP, metavar='N',
+						help='with --aggregate, most frequent values listed per field (default: %(default)s)')
+	parser.add_argument('--canonical', action='store_true',
+						help='add canonical_url and canonical_key (hex blake2b digest of canonical_url) to every result')
+	parser.add_argument('--dedup', choices=('exact', 'bloom'),
+						help='drop urls whose canonical form was seen before, remembered exactly or in a Bloom filter')
+	parser.add_argument('--dedup-capacity', type=int, default=DEDUP_CAPACITY, metavar='N',
+						help='with --dedup bloom, urls the filter is sized for (default: %(default)s)')
+	parser.add_argument('--dedup-error-rate', type=float, default=DEDUP_ERROR_RATE, metavar='P',
+						help='with --dedup bloom, share of new urls dropped as duplicates (default: %(default)s)')
+	parser.add_argument('--errors', choices=('record', 'skip', 'raise'), default='record',
+						help='what to do with urls that can\'t be parsed (default: record)')
+	parser.add_argument('--strict', action='store_true',
+						help='urls with credential or address conversion errors can\'t be parsed either, see --errors')
+	parser.add_argument('--tracebacks', action='store_true', help='print the tracebacks of errors caught while parsing')
+	parser.add_argument('--psl', metavar='FILE', help='split domains on the public suffix list in FILE (list text or --save-psl output)')
+	parser.add_argument('--save-psl', metavar='FILE', help='write the --psl list to FILE in its prebuilt form, which loads faster')
+	parser.add_argument('--blocklist', metavar='FILE', action='append',
+						help='add the rule of FILE (ip / cidr / domain list, or --save-blocklist snapshot) matching each host, repeatable')
+	parser.add_argument('--save-blocklist', metavar='FILE', help='write the --blocklist lists to FILE as one snapshot, which loads faster')
+	parser.add_argument('--query-engine', choices=('regex', 'split'), default='regex',
+						help='fill cgi with the original regex or the split based query engine (default: regex)')
+	parser.add_argument('--multi-value', action='store_true', help='with --query-engine split, cgi values are lists holding every value')
+	parser.add_argument('--decode-query', action='store_true', help='with --query-engine split, percent / \'+\' decode cgi keys and values')
+	parser.add_argument('--cache-size', type=int, default=0, metavar='N',
+						help='keep the results of the N most recently seen urls (default: off)')
+	parser.add_argument('--host-cache-size', type=int, default=0, metavar='N',
+						help='keep the ipv4/ipv6/domain results of the N most recently seen hosts (default: off)')
+	parser.add_argument('--workers', type=int, metavar='N', help='parse with N worker processes (0 = one per cpu)')
+	parser.add_argument('--unordered', action='store_true', help='with --workers, write results in completion order')
+	parser.add_argument('--chunk-size', type=int, default=PARALLEL_CHUNK_SIZE, metavar='BYTES',
+						help='with --workers, bytes of input per task (default: %(default)s)')
+	parser.add_argument('--profile', action='store_true',
+						help='time every parse stage, written to stderr as JSON when done (with --serve: on /metrics)')
+	parser.add_argument('--serve', metavar='[HOST:]PORT', help='run the HTTP parse service, POST /parse and GET /metrics')
+	parser.add_argument('--server-threads', type=int, default=SERVER_THREADS, metavar='N',
+						help='with --serve, connections handled at once (default: %(default)s)')
+	parser.add_argument('--max-body-size', type=int, default=SERVER_MAX_BODY, metavar='BYTES',
+						help='with --serve, largest request body accepted (default: %(default)s)')
+	args = parser.parse_args(argv)
 
-		finally:
-			#Return results
-			return (results, newUrlString)
+	urldOptions = {'cacheSize': args.cache_size, 'hostCacheSize': args.host_cache_size, 'strict': args.strict, 'tracebacks': args.tracebacks,
+				   'psl': args.psl, 'queryEngine': args.query_engine, 'multiValue': args.multi_value, 'decodeQuery': args.decode_query,
+				   'blocklist': args.blocklist}
+	if (args.multi_value or args.decode_query) and args.query_engine != 'split':
+		parser.error('--multi-value and --decode-query need --query-engine split')
+	if args.save_psl:
+		if not args.psl:
+			parser.error('--save-psl needs a --psl list to save')
+		loadSuffixList(args.psl).save(args.save_psl)
+		if not args.url and not args.stdin and not args.input and not args.serve and not args.save_blocklist:
+			return 0
+	if args.save_blocklist:
+		if not args.blocklist:
+			parser.error('--save-blocklist needs --blocklist lists to save')
+		loadBlocklist(args.blocklist).save(args.save_blocklist)
+		if not args.url and not args.stdin and not args.input and not args.serve:
+			return 0
+	if args.pretty and args.format not in (None, 'pretty'):
+		parser.error('--pretty can\'t be combined with --format %s' % (args.format,))
+	#One serializer for all the output, NDJSON for streams and pretty for a single url unless --format says otherwise
+	try:
+		serializer = Serializer(args.format or ('json' if (args.stdin or args.input) and not args.pretty else 'pretty'))
+	except ImportError as err:
+		parser.error(str(err))
+	urld 		= UrlDeconstruction(serializer=serializer, **urldOptions)
+	if args.profile:
+		#Worker processes would each keep their own figures
+		if args.workers is not None:
+			parser.error('--profile can\'t be combined with --workers')
+		urld.instrument()
 
-	def parseCGI(self, urlString):
-		"""
-			Attempt to get CGI values and Anchor from url string
-		"""
+	#HTTP service, --workers parses in worker processes
+	if args.serve:
+		if args.url or args.stdin or args.input:
+			parser.error('--serve can\'t be combined with a url, --stdin or --input')
+		(host, sep, port) = args.serve.rpartition(':')
+		if not (port.isascii() and port.isdigit() and int(port) <= 65535):
+			parser.error('--serve needs [HOST:]PORT with a port from 0 to 65535, not %r' % (args.serve,))
+		server = UrlParseServer((host or '127.0.0.1', int(port)), args.server_threads, args.workers, args.max_body_size,
+								args.errors, args.profile, **urldOptions)
+		sys.stderr.write('Serving on http://%s:%d/parse\n' % server.server_address[:2])
 		try:
-			#CGI Regex
-			regCGI		=	re.compile('([\w\-\.]+)[:= ] ?"?([\w\-\.\+\(\)\s:\/]+)"?|^([\w\-\.]*)|;([\w\-\.]*)$')
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			server.server_close()
+		return 0
 
-			#Create Dict and vars for results
-			results				= {}
-			results['cgi']		= {}
-			foundAnchor			= False
+	#Single url, original behaviour
+	if not args.stdin and not args.input:
+		if not args.url:
+			print(USAGE_DOC)
+			return -1
+		try:
+			urld.urlParseEngine(args.url)
+		except UrlParseError as err:
+			sys.stderr.write('urlParser: %s\n' % (err,))
+			serializer.write([urld._urlComponents], sys.stdout)
+			return 1
+		if args.canonical:
+			urld._urlComponents.update(next(canonicalResults([urld.parseUrl(args.url)], True)))
+		serializer.write([urld._urlComponents], sys.stdout)
+		if args.profile: writeProfile(urld)
+		return 0
 
-			#Parse urlString
-			out = regCGI.findall(urlString)
-			if out != [('', '', '', '')]:
-				for values in out:
-					#Shorten Value Names
-					v0 = values[0]
-					v1 = values[1]
-					v2 = values[2]
-					v3 = values[3]
-					if v0:	results['cgi'][v0] = v1
-					if v2:	results['cgi'][v2] = ''
-					if v3:	results['cgi'][v3] = ''
+	if args.url:
+		parser.error('a url argument can\'t be combined with --stdin or --input')
+	if (args.csv or args.npz) and (args.pretty or args.workers is not None or args.csv and args.npz):
+		parser.error('--csv and --npz can\'t be combined with each other, --pretty or --workers')
+	if (args.aggregate or args.csv or args.npz) and args.format:
+		parser.error('--format can\'t be combined with --aggregate, --csv or --npz')
+	if args.aggregate and (args.csv or args.npz or args.pretty):
+		parser.error('--aggregate can\'t be combined with --csv, --npz or --pretty')
+	if (args.dedup or args.canonical) and (args.csv or args.npz or args.workers is not None):
+		parser.error('--dedup and --canonical can\'t be combined with --csv, --npz or --workers')
+	seen = None
+	if args.dedup == 'bloom':
+		seen = BloomFilter(args.dedup_capacity, args.dedup_error_rate)
+	elif args.dedup:
+		seen = KeySet()
 
+	#Stream of urls, NDJSON out unless --format says otherwise
+	path 	= '-' if args.stdin else args.input
+	inFile 	= None
+	try:
+		#Workers aggregate their own tasks, the parent merges them
+		if args.aggregate:
+			if args.workers is not None:
+				aggregate = aggregate_parallel(path, args.workers, args.chunk_size, args.errors, **urldOptions)
+			elif seen is not None:
+				inFile 		= openUrlFile(path)
+				aggregate 	= UrlAggregate().update(urld.parse_unique(readUrls(inFile), args.errors, True, seen))
 			else:
-				if not foundAnchor:	results =  None
-
-		except Exception:
-			traceback.print_exc()
+				inFile 		= openUrlFile(path)
+				aggregate 	= urld.aggregate(readUrls(inFile), args.errors)
+			sys.stdout.write(json.dumps(aggregate.report(args.top), indent=4) + '\n')
+			sys.stdout.flush()
+		#Workers encode their own output, the parent only writes the record blocks
+		elif args.workers is not None:
+			(write, text) = serializer.output(sys.stdout)
+			for block in parallelChunks(path, args.workers, not args.unordered, args.chunk_size, args.errors, serializer.format, urldOptions):
+				write(block)
+			sys.stdout.flush()
+		elif args.csv or args.npz:
+			inFile = openUrlFile(path)
+			writeColumns(urld, readUrls(inFile), args.errors, args.npz)
+		elif args.dedup or args.canonical:
+			inFile = openUrlFile(path)
+			if seen is not None:
+				parsedUrls = urld.parse_unique(readUrls(inFile), args.errors, True, seen)
+			else:
+				parsedUrls = urld.parse_many(readUrls(inFile), args.errors, compact=True)
+			serializer.write(canonicalResults(parsedUrls, args.canonical), sys.stdout)
+		else:
+			inFile = openUrlFile(path)
+			serializer.write(urld.parse_many(readUrls(inFile), errors=args.errors), sys.stdout)
+	except BrokenPipeError:
+		#Reader went away (| head), point stdout at devnull so the exit flush stays quiet
+		os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+	finally:
+		if inFile is not None: inFile.close()
+	if args.profile: writeProfile(urld)
+	return 0
 
-		finally:
-			#Return results
-			return (results, '')
 
-	def urlParseEngine(self, urlInput):
-		"""
-			Systematicly Deconstruct the url string left -> right
-			See comments
-		"""
-		try:
-			#0. 	Clear Vars
-			self._urlComponents 	= {}
-			self._urlString 		= ''
-			
-			#1. 	Clean the URL, as it may be qouted
-			cleanUrl 	= urllib.parse.unquote(urlInput)
-
-			#2. 	Recored the results
-			self._urlComponents['input_url'] 	= urlInput
-			#2a. 	Make note if it was diffrent, set urlInput to new cleaned input
-			if cleanUrl != urlInput: 
-				self._urlComponents['clean_url'] = cleanUrl
-				urlInput = cleanUrl
-
-			#3. 	Set the urlString variable
-			self._urlString = urlInput
-
-			#4. 	Begin main parse logic
-			# 		--Scheme
-			outScheme 	= self.parseScheme(self._urlString)
-			if outScheme != (None, ''): self.updateStates(outScheme)
-
-			#		--Credentials
-			outCreds	= self.parseCredentials(self._urlString)
-			if outCreds != (None, ''):  self.updateStates(outCreds)
-
-
-			#5. 	IPv4/6 and Domain Parsing, First match wins
-			matchToggle = False
-			#--IPv6
-			outIpv6		= self.parseIpv6(self._urlString)
-			if outIpv6 != (None, '') and matchToggle is False:
-				self.updateStates(outIpv6)
-				matchToggle = True
-
-			#--IPv4
-			outIpv4		= self.parseIpv4(self._urlString)
-			if outIpv4 != (None, '') and matchToggle is False:
-				self.updateStates(outIpv4)
-				matchToggle = True
-
-			#--Domain
-			outDomain	 = self.parseDomain(self._urlString)
-			if outDomain != (None, '') and matchToggle is False:
-				self.updateStates(outDomain)
-				matchToggle = True
-
-			#6. 	Filter Step, if no host information was found, we should stop
-			if not matchToggle:
-				warningMessage = ({'warning_message': 'unable to determine host, stopping parser'}, '')
-				self.updateStates(warningMessage)
-				raise Exception("Unable to determine host, stopping parser")
-
-			#New. 	Anchor Parsing - We are going to remove the Anchor if it exist vs working our way to it.
-			outAnchor = self.parseAnchor(self._urlString)
-			if outAnchor != (None, ''): self.updateStates(outAnchor)
-
-			#7. 	Path Parsing
-			outPath	= self.parsePath(self._urlString)
-			if outPath != (None, ''):	self.updateStates(outPath)
-
-			#8. 	CGI/Anchor Parsing	
-			outCGI	= self.parseCGI(self._urlString)
-			if outCGI != (None, ''):	self.updateStates(outCGI)
+def writeColumns(urld, urlInputs, errors='record', npzPath=None):
+	"""
+		Parse urlInputs into columns, written to stdout as CSV in batches of COLUMN_BATCH_SIZE urls,
+		or to npzPath as NumPy arrays, which needs them all in memory
+	"""
+	if npzPath:
+		urld.parse_columns(urlInputs, errors=errors).save_npz(npzPath)
+		return
+	urlInputs = iter(urlInputs)
+	header 		= True
+	while True:
+		table = urld.parse_columns(itertools.islice(urlInputs, COLUMN_BATCH_SIZE), errors=errors)
+		if not len(table) and not header:
+			break
+		table.to_csv(sys.stdout, header)
+		header = False
+	sys.stdout.flush()
 
-		except Exception as err:
-			traceback.print_exc()
 
-		finally:
-			#Return Parsed Data
-			return self._urlComponents
+def canonicalResults(parsedUrls, canonical=False):
+	"""
+		Yields the urlComponents dict of every ParsedUrl, with canonical=True
+		canonical_url and canonical_key (hex) are added to urls that have a host
+	"""
+	for parsed in parsedUrls:
+		urlComponents = parsed.to_dict()
+		if canonical:
+			canonicalUrl = parsed.canonical()
+			if canonicalUrl is not None:
+				urlComponents['canonical_url'] = canonicalUrl
+				urlComponents['canonical_key'] = parsed.canonicalKey().hex()
+		yield urlComponents
 
 
-def main(urlString):
-	urld = UrlDeconstruction()
-	urld.urlParseEngine(urlString)
-	print(urld.returnJson())
+def writeProfile(urld):
+	"""
+		Write urld's instrumentation stats to stderr as a JSON document
+	"""
+	sys.stderr.write(json.dumps(urld.instrumentStats(), indent=4) + '\n')
 
 
-if __name__ == '__main__':
-	if len(sys.argv) > 1:
-		main(sys.argv[1])
-	else:
-		doc = """
-Input: 	Takes URL input and parses into its individual possible components
+USAGE_DOC = """Input: 	Takes URL input and parses into its individual possible components
 Output: JSON Document
 
 Possible URL Structure Examples
@@ -511,5 +4209,7 @@ Possible URL Structure Examples
 W3C  URL - http://www.w3.org/TR/url
 IPv6 URL - https://www.ietf.org/rfc/rfc2732.txt
 """
-		print(doc)
-		sys.exit(-1)
\ No newline at end of file
+
+
+if __name__ == '__main__':
+	sys.exit(main())